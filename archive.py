@@ -0,0 +1,73 @@
+"""
+ZIP 輸出
+壓縮檔直接寫入磁碟上的暫存檔 (或指定路徑)，圖片到達時逐一加入，記憶體用量不隨批次大小增加；
+JPEG / PNG 等本身已壓縮的格式以 ZIP_STORED 存放，不再浪費 CPU 重新壓縮。
+以記憶體中的檔名 / 內容雜湊索引取代每次寫入前呼叫 zf.namelist() 的線性搜尋。
+"""
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+# 已壓縮的格式，deflate 幾乎無法再縮小
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.xlsx'}
+
+
+def compress_type_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class ArchiveWriter:
+    """包裝 zipfile.ZipFile，記錄已寫入的檔名與每個資料夾內的內容雜湊"""
+
+    def __init__(self, zf, path=None):
+        self.zf = zf
+        self.path = path
+        self.names = set()
+        self._hashes = {}  # (資料夾, sha256) -> 檔名
+
+    @classmethod
+    def create(cls, path=None):
+        """在磁碟上建立壓縮檔；未指定路徑時使用暫存檔 (由呼叫端負責刪除)"""
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.zip', prefix='montbell_')
+            os.close(fd)
+        return cls(zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED), path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def _zipinfo(self, path):
+        zinfo = zipfile.ZipInfo(path, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type_for(path)
+        zinfo.external_attr = 0o600 << 16
+        return zinfo
+
+    def find_duplicate(self, folder, sha256):
+        """同一資料夾內已有相同內容時回傳該檔名"""
+        return self._hashes.get((folder, sha256))
+
+    def add_file(self, path, fileobj, folder=None, sha256=None):
+        """由檔案物件分段複製進 ZIP，不一次讀入記憶體"""
+        with self.zf.open(self._zipinfo(path), 'w') as dest:
+            shutil.copyfileobj(fileobj, dest, CHUNK_SIZE)
+        self.names.add(path)
+        if sha256:
+            self._hashes[(folder, sha256)] = path
+
+    def writestr(self, path, data):
+        self.zf.writestr(self._zipinfo(path), data)
+        self.names.add(path)
+
+    def close(self):
+        self.zf.close()
@@ -0,0 +1,99 @@
+"""
+圖片提取微基準測試
+比較原始邏輯 (BeautifulSoup html.parser + 五次 CSS 選擇器) 與 extractors 的單次走訪，
+並逐頁確認兩者輸出的 URL 與順序完全相同。
+
+用法 (於專案根目錄):
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --pages saved_pages/ --repeat 5
+"""
+import argparse
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from extractors import parse_html, extract_images_from_html, extract_images_from_js
+from scraper import original_extract_images_from_html, original_extract_images_from_js
+from benchmarks.fixtures import synthetic_pages, saved_pages
+from benchmarks.bench_js import covers
+
+
+def _best_of(repeat, func):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_equivalence(pages):
+    """回傳不一致的頁面清單"""
+    mismatches = []
+    for base_url, content in pages:
+        soup = BeautifulSoup(content, 'html.parser')
+        tree = parse_html(content)
+        if original_extract_images_from_html(soup, base_url) != extract_images_from_html(tree, base_url):
+            mismatches.append((base_url, 'html'))
+        # JS 新版支援更多寫法，只要求涵蓋原始結果 (見 bench_js.py)
+        if not covers(original_extract_images_from_js(soup, base_url), extract_images_from_js(tree, base_url)):
+            mismatches.append((base_url, 'js'))
+    return mismatches
+
+
+def run(pages, repeat):
+    soups = [BeautifulSoup(content, 'html.parser') for _, content in pages]
+    trees = [parse_html(content) for _, content in pages]
+
+    cases = [
+        ('解析: html.parser', lambda: [BeautifulSoup(c, 'html.parser') for _, c in pages]),
+        ('解析: lxml', lambda: [parse_html(c) for _, c in pages]),
+        ('HTML 提取: 原始', lambda: [original_extract_images_from_html(s, u) for s, (u, _) in zip(soups, pages)]),
+        ('HTML 提取: 單次走訪', lambda: [extract_images_from_html(t, u) for t, (u, _) in zip(trees, pages)]),
+        ('JS 提取: 原始', lambda: [original_extract_images_from_js(s, u) for s, (u, _) in zip(soups, pages)]),
+        ('JS 提取: 新版', lambda: [extract_images_from_js(t, u) for t, (u, _) in zip(trees, pages)]),
+        ('合計: 原始', lambda: [
+            (original_extract_images_from_html(s, u), original_extract_images_from_js(s, u))
+            for s, u in ((BeautifulSoup(c, 'html.parser'), u) for u, c in pages)]),
+        ('合計: 新版', lambda: [
+            (extract_images_from_html(t, u), extract_images_from_js(t, u))
+            for t, u in ((parse_html(c), u) for u, c in pages)]),
+    ]
+
+    results = {}
+    for name, func in cases:
+        results[name] = _best_of(repeat, func)
+        per_page = results[name] / len(pages) * 1000
+        print(f"{name:<20} {per_page:9.3f} ms/頁")
+
+    base, new = results['合計: 原始'], results['合計: 新版']
+    print(f"\n加速比 (合計): {base / new:.1f}x")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', help='存下的商品頁目錄 (*.html)，未指定時使用合成頁面')
+    parser.add_argument('--count', type=int, default=20, help='合成頁面數量')
+    parser.add_argument('--repeat', type=int, default=3, help='每項重複次數 (取最佳值)')
+    args = parser.parse_args(argv)
+
+    pages = saved_pages(args.pages) if args.pages else synthetic_pages(args.count)
+    if not pages:
+        print('沒有可用的頁面', file=sys.stderr)
+        return 1
+    print(f"頁面數: {len(pages)}\n")
+
+    mismatches = check_equivalence(pages)
+    if mismatches:
+        for base_url, kind in mismatches:
+            print(f"❌ 輸出不一致 ({kind}): {base_url}", file=sys.stderr)
+        return 1
+
+    run(pages, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
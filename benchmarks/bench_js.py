@@ -0,0 +1,71 @@
+"""
+cimages / kimages 腳本解析基準測試
+比較原始邏輯 (逐行呼叫四次未編譯的 re.search) 與 extractors 的預編譯 finditer 掃描。
+新版另支援雙引號、同一行多個賦值與物件實字，因此只要求：原始邏輯找到的 URL
+新版都找到且順序相同，並列出新版額外找到的數量。
+
+用法 (於專案根目錄):
+    python -m benchmarks.bench_js
+    python -m benchmarks.bench_js --pages saved_pages/ --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from extractors import parse_html, extract_images_from_js
+from scraper import original_extract_images_from_js
+from benchmarks.fixtures import PAGES_DIR, saved_pages
+
+
+def covers(old, new):
+    """新版結果是否包含原始結果且相對順序相同"""
+    old_set = set(old)
+    return [url for url in new if url in old_set] == old
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', default=PAGES_DIR, help='商品頁目錄 (*.html)，預設為 benchmarks/pages')
+    parser.add_argument('--repeat', type=int, default=50, help='每頁重複次數 (取最佳值)')
+    args = parser.parse_args(argv)
+
+    pages = saved_pages(args.pages)
+    if not pages:
+        print('沒有可用的頁面', file=sys.stderr)
+        return 1
+
+    failed = False
+    total_old = total_new = 0.0
+    print(f"{'頁面':<16}{'原始 ms':>10}{'新版 ms':>10}{'加速比':>8}{'原始URL':>9}{'新版URL':>9}")
+    for base_url, content in pages:
+        soup = BeautifulSoup(content, 'html.parser')
+        tree = parse_html(content)
+        old = original_extract_images_from_js(soup, base_url)
+        new = extract_images_from_js(tree, base_url)
+        if not covers(old, new):
+            print(f"❌ 新版遺漏或順序不同: {base_url}", file=sys.stderr)
+            failed = True
+
+        t_old = t_new = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            original_extract_images_from_js(soup, base_url)
+            t_old = min(t_old, time.perf_counter() - start)
+            start = time.perf_counter()
+            extract_images_from_js(tree, base_url)
+            t_new = min(t_new, time.perf_counter() - start)
+        total_old += t_old
+        total_new += t_new
+
+        name = os.path.basename(base_url.split('=')[-1])
+        print(f"{name:<16}{t_old * 1000:>10.3f}{t_new * 1000:>10.3f}{t_old / t_new:>7.1f}x{len(old):>9}{len(new):>9}")
+
+    print(f"\n加速比 (合計): {total_old / total_new:.1f}x")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
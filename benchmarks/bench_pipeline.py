@@ -0,0 +1,227 @@
+"""
+完整批次管線基準測試 (離線)
+啟動本機替身伺服器 (benchmarks/server.py)，以 BatchEngine 處理一批型號並寫入暫存 ZIP，
+報告 型號/秒、圖片/秒、MB/秒、峰值記憶體 (RSS)、各 HTTP 階段延遲百分位數與管線計量 (metrics.py)；
+另對伺服器上的商品頁逐頁測量 解析 / HTML 提取 / JS 提取 / 候選篩選 的延遲。
+可指定多組並發數比較，每組在獨立程序中執行，峰值記憶體互不影響。
+快取、圖片庫、執行紀錄與商品索引皆停用，每次都實際經過網路。
+
+用法 (於專案根目錄):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --models 200 --concurrency 4 8 16 --latency 0.05 --throttle-rate 0.01
+    python -m benchmarks.bench_pipeline --json result.json
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from archive import ArchiveWriter
+from candidates import CandidateFilter, select_candidates
+from engine import BatchEngine, EngineConfig
+from extractors import parse_html, extract_images_from_html, extract_images_from_js
+from pipeline import ModelJob, DEFAULT_PER_HOST
+from benchmarks.server import ServerOptions, ServerProcess, DEFAULT_IMAGE_SIZE
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PERCENTILES = (50, 90, 99)
+FIRST_MODEL = 1128001  # 前幾個型號使用 benchmarks/pages/ 收錄的頁面
+
+
+def percentiles(values, points=PERCENTILES):
+    """最近排名法百分位數，回傳 {'p50': ..., 'max': ...} (毫秒)"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f'p{p}': ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] * 1000
+              for p in points}
+    result['max'] = ordered[-1] * 1000
+    return result
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # Linux 單位為 KB，macOS 為 bytes
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+class StageTimer:
+    """記錄每次呼叫的耗時 (HTTP 請求層；管線各階段由 StageMetrics 記錄)"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def instrument(self, pipeline):
+        # 以實例屬性覆蓋 request，get / head 也會經過計時 (含重試與速率等待)
+        request = pipeline.client.request
+
+        @functools.wraps(request)
+        def timed_request(method, url, stage='default', **kwargs):
+            started = time.perf_counter()
+            try:
+                return request(method, url, stage=stage, **kwargs)
+            finally:
+                self.add(f'HTTP {stage}', time.perf_counter() - started)
+        pipeline.client.request = timed_request
+
+    def rows(self):
+        with self._lock:
+            return {stage: dict(percentiles(values), n=len(values)) for stage, values in sorted(self.samples.items())}
+
+
+def model_numbers(count):
+    return [str(FIRST_MODEL + i) for i in range(count)]
+
+
+def run_scenario(base_url, count, concurrency, per_host, start_rate, max_rate):
+    """在子程序中執行一次完整批次，回傳結果 dict"""
+    config = EngineConfig(domain=base_url, concurrency=concurrency, per_host=per_host, start_rate=start_rate,
+                          max_rate=max_rate, cache_ttl=0, use_image_store=False, use_manifest=False,
+                          use_product_index=False)
+    jobs = [ModelJob(i, model) for i, model in enumerate(model_numbers(count))]
+    timer = StageTimer()
+
+    with tempfile.TemporaryDirectory() as tmp, BatchEngine(config) as engine:
+        timer.instrument(engine.pipeline)
+        zip_path = os.path.join(tmp, 'bench.zip')
+        started = time.perf_counter()
+        with ArchiveWriter.create(zip_path) as archive:
+            summary = engine.run(jobs, archive)
+        elapsed = time.perf_counter() - started
+        zip_bytes = os.path.getsize(zip_path)
+
+    return {
+        'concurrency': concurrency,
+        'per_host': per_host,
+        'models': len(jobs),
+        'images': summary.download_count,
+        'zip_bytes': zip_bytes,
+        'elapsed': elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': timer.rows(),
+        'pipeline': summary.stage_rows,
+        'http': summary.http_rows,
+        'rate': summary.rate_rows,
+        'rate_events': len(summary.rate_events),
+    }
+
+
+def bench_extractors(base_url, count, repeat=3):
+    """由伺服器取得商品頁，逐頁測量解析與提取的耗時 (各頁取最佳值)"""
+    with requests.Session() as session:
+        pages = [(url, session.get(url).content) for url in
+                 (f'{base_url}/goods/disp.php?product_id={model}' for model in model_numbers(count))]
+
+    timer = StageTimer()
+    url_filter = CandidateFilter()
+    for url, content in pages:
+        best = {}
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            tree = parse_html(content)
+            t1 = time.perf_counter()
+            html_images = extract_images_from_html(tree, url)
+            t2 = time.perf_counter()
+            js_images = extract_images_from_js(tree, url)
+            t3 = time.perf_counter()
+            select_candidates(list(dict.fromkeys(html_images + js_images)), url_filter)
+            t4 = time.perf_counter()
+            for stage, seconds in (('解析', t1 - t0), ('HTML 提取', t2 - t1), ('JS 提取', t3 - t2),
+                                   ('候選篩選', t4 - t3)):
+                best[stage] = min(best.get(stage, seconds), seconds)
+        for stage, seconds in best.items():
+            timer.add(stage, seconds)
+    return timer.rows()
+
+
+def _server_stats(base_url, reset=False):
+    return requests.get(f"{base_url}/{'__reset' if reset else '__stats'}").json()
+
+
+def print_stages(stages):
+    print(f"  {'階段':<14}{'次數':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    for stage, row in stages.items():
+        print(f"  {stage:<14}{row['n']:>7}" + ''.join(f"{row[k]:>10.2f}" for k in ('p50', 'p90', 'p99', 'max')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, default=50, help='型號數量')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8], help='要比較的並發數 (可多個)')
+    parser.add_argument('--per-host', type=int, help=f'每個主機連線上限 (預設與並發數相同，最少 {DEFAULT_PER_HOST})')
+    parser.add_argument('--start-rate', type=float, help='初始請求速率 (次/秒，預設等於上限)')
+    parser.add_argument('--max-rate', type=float, default=1000, help='請求速率上限 (次/秒)')
+    parser.add_argument('--latency', type=float, default=0.0, help='伺服器回應延遲 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='伺服器額外隨機延遲上限 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='伺服器回傳 500 的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='伺服器回傳 429 的比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 回應的 Retry-After (秒)')
+    parser.add_argument('--image-kb', type=int, default=DEFAULT_IMAGE_SIZE // 1024, help='圖片平均大小 (KB)')
+    parser.add_argument('--json', help='將結果寫入 JSON 檔 (用於比較不同版本)')
+    args = parser.parse_args(argv)
+
+    options = ServerOptions(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                            args.image_kb * 1024)
+    results = {'server': vars(options), 'scenarios': []}
+    spawn = multiprocessing.get_context('spawn')
+
+    with ServerProcess(options) as base_url:
+        print(f"替身伺服器: {base_url} | 型號數: {args.models}\n")
+        print(f"{'並發':>4}{'型號/秒':>10}{'圖片/秒':>10}{'MB/秒':>9}{'峰值RSS(MB)':>13}{'重試':>6}{'失敗':>6}{'減速':>6}")
+        for concurrency in args.concurrency:
+            per_host = args.per_host or max(concurrency, DEFAULT_PER_HOST)
+            _server_stats(base_url, reset=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                result = pool.submit(run_scenario, base_url, args.models, concurrency, per_host,
+                                     args.start_rate or args.max_rate, args.max_rate).result()
+            result['server'] = _server_stats(base_url)
+            received = sum(c['bytes'] for c in result['server'].values())
+            retries = sum(row['重試次數'] for row in result['http'])
+            failures = sum(row['失敗次數'] for row in result['http'])
+            rss = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] is not None else '-'
+            print(f"{concurrency:>4}{result['models'] / result['elapsed']:>10.2f}"
+                  f"{result['images'] / result['elapsed']:>10.1f}{received / result['elapsed'] / 1e6:>9.2f}"
+                  f"{rss:>13}{retries:>6}{failures:>6}{result['rate_events']:>6}")
+            results['scenarios'].append(result)
+
+        print()
+        for result in results['scenarios']:
+            print(f"並發 {result['concurrency']} HTTP 延遲:")
+            print_stages(result['stages'])
+            print(f"並發 {result['concurrency']} 管線各階段 (直方圖估計):")
+            print(f"  {'階段':<14}{'次數':>7}{'錯誤':>6}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+            for row in result['pipeline']:
+                print(f"  {row['階段']:<14}{row['次數']:>7}{row['錯誤']:>6}" + ''.join(
+                    f"{row[k]:>10.2f}" for k in ('p50 (ms)', 'p90 (ms)', 'p99 (ms)', '最大 (ms)')))
+        results['extractors'] = bench_extractors(base_url, args.models)
+
+    print("\n商品頁解析 / 提取 (每頁):")
+    print_stages(results['extractors'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+基準測試用的商品頁樣本
+依 Montbell 商品頁結構合成 (fancy_largelink / #img_hidden_pre / #largelinkImg /
+.cutImglArea / cimages、kimages 腳本，並包含大量網站版面圖片)，
+另可載入實際存下的商品頁 (*.html)；benchmarks/pages/ 收錄了固定的樣本頁，
+benchmarks/pages/search/ 收錄對應的搜尋結果頁。
+"""
+import glob
+import os
+import random
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+SEARCH_PAGES_DIR = os.path.join(PAGES_DIR, 'search')
+DEFAULT_BASE_URL = 'https://webshop.montbell.jp/goods/disp.php?product_id={model}'
+
+COLOR_CODES = ['BK', 'NV', 'RD', 'BL', 'GY', 'OL', 'TN', 'DKBR', 'LTGY', 'SUGR']
+
+
+def _js_tables(model, colors, js_style):
+    """cimages / kimages 表的各種寫法：single (原始逐行單引號) / double / multi (同一行多個賦值) / object"""
+    tables = [
+        ('cimages', lambda c: f'c_{model}_{c}.jpg'),
+        ('kimages', lambda c: f'k_{model}_{c}.jpg'),
+        ('cimage_paths', lambda c: '/common/images/product/prod_c'),
+        ('kimage_paths', lambda c: '/common/images/product/prod_k'),
+    ]
+    if js_style == 'object':
+        return ''.join(
+            f"{name} = {{{', '.join(repr(c) + ': ' + repr(value(c)) for c in colors)}}};\n" for name, value in tables)
+    if js_style == 'multi':
+        return ''.join(f"{name}['{c}'] = '{value(c)}'; " for c in colors for name, value in tables) + '\n'
+    quote = '"' if js_style == 'double' else "'"
+    return ''.join(f"{name}[{quote}{c}{quote}] = {quote}{value(c)}{quote};\n" for c in colors for name, value in tables)
+
+
+def product_page(model, n_colors=6, n_cuts=8, n_chrome=120, seed=0, js_style='single'):
+    """合成一個商品頁 (str)"""
+    rng = random.Random(f'{model}-{seed}')
+    colors = COLOR_CODES[:n_colors]
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>', model, '</title>']
+
+    # 網站共用腳本 (不含圖片表)
+    parts.append('<script>')
+    parts.extend(f"var cfg_{i} = '{rng.random():.6f}';\n" for i in range(200))
+    parts.append('</script></head><body><div id="header"><ul class="gnav">')
+
+    # 網站版面圖片 (選單、圖示、橫幅)
+    for i in range(n_chrome):
+        ext = rng.choice(['.png', '.gif', '.jpg', '.svg'])
+        parts.append(f'<li><a href="/goods/list.php?category={i}"><img src="/common/images/nav/icon_{i}{ext}" alt=""></a></li>')
+    parts.append('</ul></div><div id="goodsDetail">')
+
+    # 1. fancy_largelink
+    parts.append('<div class="largeImgArea">')
+    for c in colors:
+        parts.append(
+            f'<a class="fancy_largelink" href="/common/images/product/prod_k/k_{model}_{c}.jpg">'
+            f'<img src="/common/images/product/prod_c/c_{model}_{c}.jpg" alt="{c}"></a>')
+    parts.append(f'<img id="largelinkImg" src="/common/images/product/prod_k/k_{model}_{colors[0]}.jpg"></div>')
+
+    # 2. 隱藏區域
+    parts.append('<div id="img_hidden_pre" style="display:none">')
+    parts.extend(f'<img src="/common/images/product/prod_c/c_{model}_{c}.jpg">' for c in colors)
+    parts.append('</div><div id="img_hidden_later" style="display:none">')
+    parts.extend(f'<img src="/common/images/product/prod_k/k_{model}_{c}.jpg">' for c in colors)
+    parts.append('</div>')
+
+    # 4. 縮略圖區域
+    parts.append('<ul class="cutImglArea clearfix">')
+    parts.extend(f'<li><img src="/common/images/product/cut_c/cc_{model}_{i:02d}.jpg"></li>' for i in range(n_cuts))
+    parts.extend(f'<li><img src="/common/images/product/prod_c/c_{model}_{c}.jpg"></li>' for c in colors)
+    parts.append('</ul>')
+
+    # 推薦商品 (相對網址與絕對網址混合)
+    for i in range(20):
+        parts.append(f'<div class="rec"><a href="/goods/disp.php?product_id={i}">'
+                     f'<img src="https://webshop.montbell.jp/common/images/product/prod_c/c_{1100000 + i}_BK.jpg"></a></div>')
+    parts.append('</div>')
+
+    # cimages / kimages 腳本
+    parts.append('<script type="text/javascript">\nvar cimages = new Array();\nvar kimages = new Array();\n'
+                 'var cimage_paths = new Array();\nvar kimage_paths = new Array();\n')
+    for i in range(300):
+        parts.append(f"var stock_{i} = {rng.randint(0, 9)};\n")
+    parts.append(_js_tables(model, colors, js_style))
+    parts.append('</script>')
+
+    parts.append('<div id="footer">')
+    parts.extend(f'<img src="/common/images/footer/bn_{i}.png">' for i in range(30))
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def search_page(model, n_chrome=60, seed=0):
+    """合成 list_search.php 的搜尋結果頁 (str)：一個商品連結 + 網站選單與推薦商品"""
+    rng = random.Random(f'search-{model}-{seed}')
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>検索結果</title></head><body>',
+             '<div id="header"><ul class="gnav">']
+    for i in range(n_chrome):
+        parts.append(f'<li><a href="/goods/list.php?category={i}"><img src="/common/images/nav/icon_{i}.png"></a></li>')
+    parts.append('</ul></div><div id="searchResult"><ul class="itemList">')
+    parts.append(f'<li><a href="/goods/disp.php?product_id={model}">'
+                 f'<img src="/common/images/product/prod_c/c_{model}_BK.jpg"><p>{model}</p></a></li>')
+    parts.append('</ul></div><div class="ranking">')
+    parts.extend(f'<a href="/special/ranking_{rng.randint(1, 99)}.html">ranking</a>' for _ in range(10))
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def synthetic_pages(count=20, **kwargs):
+    """回傳 [(base_url, html_bytes)]"""
+    pages = []
+    for i in range(count):
+        model = str(1128000 + i)
+        pages.append((DEFAULT_BASE_URL.format(model=model), product_page(model, seed=i, **kwargs).encode('utf-8')))
+    return pages
+
+
+def saved_pages(directory):
+    """載入存下的商品頁；檔名 (不含副檔名) 視為型號"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        model = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            pages.append((DEFAULT_BASE_URL.format(model=model), f.read()))
+    return pages
@@ -0,0 +1,229 @@
+"""
+本機 Montbell 替身伺服器 (離線基準測試用)
+提供與網站相同路徑的搜尋結果頁、商品頁與圖片：
+- /goods/list_search.php?top_sk={型號}  benchmarks/pages/search/ 收錄的頁面，其餘型號即時合成
+- /goods/disp.php?product_id={型號}     benchmarks/pages/ 收錄的頁面，其餘型號即時合成
+- 其他 .jpg / .png / .gif               依路徑產生的固定內容圖片 (大小可設定)
+頁面中指向正式網站的絕對網址會改寫為本伺服器，測試時不會連到外部；
+可設定回應延遲、錯誤率 (500) 與 429 (附 Retry-After) 的注入比例；
+/__stats 回傳各類請求數與傳送位元組數 (JSON)，/__reset 歸零。
+
+用法 (於專案根目錄):
+    python -m benchmarks.server --port 8000 --latency 0.05 --error-rate 0.01 --throttle-rate 0.02
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import socketserver
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.fixtures import PAGES_DIR, SEARCH_PAGES_DIR, product_page, search_page
+
+LIVE_ORIGIN = b'https://webshop.montbell.jp'
+IMAGE_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif'}
+IMAGE_HEADERS = {'.jpg': b'\xff\xd8\xff\xe0', '.jpeg': b'\xff\xd8\xff\xe0', '.png': b'\x89PNG\r\n\x1a\n',
+                 '.gif': b'GIF89a'}
+DEFAULT_IMAGE_SIZE = 200 * 1024
+
+
+class ServerOptions:
+    """回應行為設定 (延遲單位為秒，比例為 0 ~ 1)"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 image_size=DEFAULT_IMAGE_SIZE, pages_dir=PAGES_DIR, search_dir=SEARCH_PAGES_DIR, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.image_size = image_size
+        self.pages_dir = pages_dir
+        self.search_dir = search_dir
+        self.seed = seed
+
+
+def _read_page(directory, model):
+    path = os.path.join(directory, f'{model}.html')
+    if os.path.basename(path) != f'{model}.html' or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def synthetic_image(path, size, ext):
+    """依路徑產生固定內容 (不同圖片內容不同，大小在 size 的 ±25% 內)"""
+    digest = hashlib.sha256(path.encode('utf-8')).digest()
+    length = int(size * (0.75 + digest[0] / 510))
+    header = IMAGE_HEADERS.get(ext, b'')
+    return header + (digest * (length // len(digest) + 1))[:max(length - len(header), 0)]
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        return len(body)
+
+    def _localize(self, body):
+        return body.replace(LIVE_ORIGIN, f"http://{self.headers.get('Host')}".encode('ascii'))
+
+    def _route(self):
+        server = self.server
+        options = server.options
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/__stats':
+            return self._send(200, 'application/json', json.dumps(server.snapshot()).encode('utf-8'))
+        if url.path == '/__reset':
+            server.reset()
+            return self._send(200, 'application/json', b'{}')
+
+        ext = os.path.splitext(url.path)[1].lower()
+        kind = ('search' if url.path == '/goods/list_search.php' else
+                'product' if url.path in ('/goods/disp.php', '/goods/detail.php') else
+                'image' if ext in IMAGE_TYPES else 'other')
+
+        delay = options.latency + (server.random() * options.jitter if options.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        roll = server.random()
+        if roll < options.throttle_rate:
+            server.count(kind, 'throttled', 0)
+            return self._send(429, 'text/html', b'Too Many Requests', {'Retry-After': str(options.retry_after)})
+        if roll < options.throttle_rate + options.error_rate:
+            server.count(kind, 'errors', 0)
+            return self._send(500, 'text/html', b'Internal Server Error')
+
+        if kind == 'search':
+            model = query.get('top_sk', [''])[0]
+            body = _read_page(options.search_dir, model) or search_page(model).encode('utf-8')
+            body = self._localize(body)
+            sent = self._send(200, 'text/html; charset=utf-8', body)
+        elif kind == 'product':
+            model = query.get('product_id', [''])[0]
+            body = _read_page(options.pages_dir, model) or product_page(model, seed=options.seed).encode('utf-8')
+            body = self._localize(body)
+            sent = self._send(200, 'text/html; charset=utf-8', body)
+        elif kind == 'image':
+            body = synthetic_image(url.path, options.image_size, ext)
+            sent = self._send(200, IMAGE_TYPES[ext], body)
+        else:
+            sent = self._send(404, 'text/html', b'Not Found')
+        server.count(kind, 'requests', sent)
+
+    def do_GET(self):
+        self._route()
+
+    def do_HEAD(self):
+        self._route()
+
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, options=None):
+        super().__init__(address, StandInHandler)
+        self.options = options or ServerOptions()
+        self._lock = threading.Lock()
+        self._random = random.Random(self.options.seed)
+        self._stats = {}
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, kind, name, sent):
+        with self._lock:
+            c = self._stats.setdefault(kind, {'requests': 0, 'errors': 0, 'throttled': 0, 'bytes': 0})
+            c[name] += 1
+            c['bytes'] += sent
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(c) for kind, c in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def handle_error(self, request, client_address):
+        pass  # 用戶端中途斷線 (例如超過圖片大小上限) 不輸出錯誤
+
+
+def _serve(options, port, ready):
+    server = StandInServer(('127.0.0.1', port), options)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class ServerProcess:
+    """
+    在獨立程序中執行替身伺服器，避免伺服器與受測程式爭用 GIL 或計入受測程式的記憶體
+    用法: with ServerProcess(options) as base_url: ...
+    """
+
+    def __init__(self, options=None, port=0):
+        self.options = options or ServerOptions()
+        self.port = port
+        self._process = None
+
+    def __enter__(self):
+        ready = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(self.options, self.port, ready), daemon=True)
+        self._process.start()
+        self.port = ready.get(timeout=30)
+        return f'http://127.0.0.1:{self.port}'
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='每個回應的固定延遲 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='額外的隨機延遲上限 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 500 的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='回傳 429 的比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 回應的 Retry-After (秒)')
+    parser.add_argument('--image-kb', type=int, default=DEFAULT_IMAGE_SIZE // 1024, help='圖片平均大小 (KB)')
+    args = parser.parse_args(argv)
+
+    options = ServerOptions(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                            args.image_kb * 1024)
+    server = StandInServer(('127.0.0.1', args.port), options)
+    print(f"替身伺服器: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+圖片候選篩選
+提取函數會同時產出同一張圖的多種解析度 (/prod_c/ 與 /prod_k/、/cut_c/ 與 /cut_k/、
+縮圖 src 與 fancy_largelink href)，以及頁面上所有的網站版面圖片。
+此階段在任何網路請求之前：
+1. 以篩選規則去除非商品圖片
+2. 依邏輯圖片 (商品 / 顏色 / 細節圖) 分組，每組只保留由高到低的解析度清單，
+   下載時只取最高解析度，遇到 404 才退回較低解析度
+"""
+import re
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+# 解析度由高到低
+RESOLUTION_ORDER = ('k', 'c')
+
+# 各類圖片在不同解析度下的檔名前綴 (資料夾為 {種類}_{解析度})
+VARIANT_PREFIXES = {
+    'prod': {'k': 'k', 'c': 'c'},
+    'cut': {'k': 'ck', 'c': 'cc'},
+}
+
+# .../{prod|cut}_{解析度}/{前綴}_{其餘檔名}
+_VARIANT_PATH = re.compile(r'^(?P<parent>.*)/(?P<kind>prod|cut)_(?P<res>[a-z]+)/(?P<prefix>[a-z]+)_(?P<rest>[^/]+)$')
+
+DEFAULT_INCLUDE = (r'/images/product/',)
+
+
+@dataclass
+class ImageCandidate:
+    """一張邏輯圖片，urls 依解析度由高到低排列"""
+    key: tuple
+    urls: list
+
+
+class CandidateFilter:
+    """以正規表示式比對 URL 路徑，決定是否為商品圖片；include 為空表示全部保留"""
+
+    def __init__(self, include=DEFAULT_INCLUDE, exclude=()):
+        self.include = [re.compile(p) for p in include]
+        self.exclude = [re.compile(p) for p in exclude]
+
+    def __call__(self, url):
+        path = urlparse(url).path
+        if self.include and not any(p.search(path) for p in self.include):
+            return False
+        return not any(p.search(path) for p in self.exclude)
+
+
+def _variants(url):
+    """回傳 (邏輯鍵, 由高到低的所有解析度 URL)；無法辨識時回傳 None"""
+    parsed = urlparse(url)
+    m = _VARIANT_PATH.match(parsed.path)
+    if not m or m.group('res') not in RESOLUTION_ORDER:
+        return None
+    kind = m.group('kind')
+    if VARIANT_PREFIXES[kind][m.group('res')] != m.group('prefix'):
+        return None
+
+    key = (parsed.netloc, m.group('parent'), kind, m.group('rest'))
+    urls = []
+    for res in RESOLUTION_ORDER:
+        path = f"{m.group('parent')}/{kind}_{res}/{VARIANT_PREFIXES[kind][res]}_{m.group('rest')}"
+        urls.append(parsed._replace(path=path).geturl())
+    return key, urls
+
+
+def select_candidates(image_urls, url_filter=None):
+    """
+    將提取到的 URL 篩選並分組，依首次出現順序回傳 ImageCandidate 清單
+    可辨識解析度的圖片從最高解析度開始嘗試 (即使頁面上只出現低解析度版本)；
+    其餘圖片各自成組
+    """
+    candidates = {}
+    for url in image_urls:
+        if url_filter is not None and not url_filter(url):
+            continue
+        variants = _variants(url)
+        if variants is None:
+            candidates.setdefault(url, ImageCandidate(url, [url]))
+            continue
+        key, urls = variants
+        candidates.setdefault(key, ImageCandidate(key, urls))
+    return list(candidates.values())
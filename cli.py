@@ -0,0 +1,114 @@
+"""
+命令列批次下載 (不需 Streamlit)
+一次處理整份 Excel / CSV 的所有型號，進度與吞吐量輸出到 stderr，完成後將壓縮檔路徑輸出到 stdout。
+
+用法:
+    python cli.py 型號清單.xlsx -o output/ --concurrency 8 --max-rate 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from engine import EngineConfig, DEFAULT_DOMAIN, run_workbook
+from manifest import workbook_manifest_path
+from metrics import to_prometheus
+from page_cache import DEFAULT_TTL
+from rate_control import DEFAULT_START_RATE, DEFAULT_MAX_RATE
+from product_index import DEFAULT_INDEX_TTL, DEFAULT_SEEDS, DEFAULT_MAX_PAGES, DEFAULT_MIN_MISSES
+from pipeline import DEFAULT_CONCURRENCY, DEFAULT_PER_HOST
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='型號清單 (.xlsx / .xls / .csv)')
+    parser.add_argument('-o', '--output-dir', default='.', help='輸出目錄 (預設為目前目錄)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='同時連線數')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help='每個主機連線上限')
+    parser.add_argument('--rate', type=float, default=DEFAULT_START_RATE, help='每個主機的初始請求速率 (次/秒)')
+    parser.add_argument('--max-rate', type=float, default=DEFAULT_MAX_RATE, help='每個主機的請求速率上限 (次/秒)')
+    parser.add_argument('--domain', default=DEFAULT_DOMAIN, help='域名')
+    parser.add_argument('--max-image-mb', type=float, default=0, help='單張圖片上限 (MB，0 為不限)')
+    parser.add_argument('--cache-hours', type=float, default=DEFAULT_TTL / 3600, help='頁面快取有效時間 (小時，0 為停用)')
+    parser.add_argument('--no-image-store', action='store_true', help='不重用先前已下載的圖片')
+    parser.add_argument('--all-images', action='store_true', help='連同網站圖示、橫幅等非商品圖片一併下載')
+    parser.add_argument('--manifest', help='執行紀錄路徑 (預設為輸出目錄下的 montbell_<檔名>.manifest.sqlite3)')
+    parser.add_argument('--no-resume', action='store_true', help='不使用執行紀錄，所有型號重新處理')
+    parser.add_argument('--fresh', action='store_true', help='清除執行紀錄後重新開始')
+    parser.add_argument('--incremental', action='store_true', help='增量更新：已完成的型號只重新檢查商品頁是否變更')
+    parser.add_argument('--no-product-index', action='store_true', help='不使用商品索引，每個型號都搜尋')
+    parser.add_argument('--index-seed', action='append', help='商品列表起始網址 (可重複指定，預設為網站首頁)')
+    parser.add_argument('--index-pages', type=int, default=DEFAULT_MAX_PAGES, help='每次更新索引最多抓取的列表頁數')
+    parser.add_argument('--index-hours', type=float, default=DEFAULT_INDEX_TTL / 3600, help='商品索引有效時間 (小時)')
+    parser.add_argument('--index-min', type=int, default=DEFAULT_MIN_MISSES,
+                        help='需查詢的型號達此數量才抓取列表頁 (0 為一律抓取)')
+    parser.add_argument('--metrics-json', help='將各階段計量輸出為 JSON 檔')
+    parser.add_argument('--metrics-prom', help='將各階段計量輸出為 Prometheus 文字格式檔')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stem = os.path.splitext(os.path.basename(args.input))[0]
+    config = EngineConfig(
+        domain=args.domain,
+        start_rate=args.rate,
+        max_rate=args.max_rate,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        max_image_bytes=int(args.max_image_mb * 1024 * 1024) or None,
+        cache_ttl=int(args.cache_hours * 3600),
+        use_image_store=not args.no_image_store,
+        product_only=not args.all_images,
+        use_manifest=not args.no_resume,
+        manifest_path=args.manifest or workbook_manifest_path(args.input, args.output_dir),
+        incremental=args.incremental,
+        fresh=args.fresh,
+        use_product_index=not args.no_product_index,
+        index_ttl=int(args.index_hours * 3600),
+        index_seeds=tuple(args.index_seed or DEFAULT_SEEDS),
+        index_max_pages=args.index_pages,
+        index_min_misses=args.index_min,
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"montbell_{stem}.zip")
+
+    started = time.perf_counter()
+    images = 0
+
+    def on_result(done, total, result, row):
+        nonlocal images
+        images += row["圖片數量"]
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        for line in result.logs:
+            print(line, file=sys.stderr)
+        print(f"[{done}/{total}] {result.model_number}: {row['圖片數量']} 張 | "
+              f"{done / elapsed:.2f} 型號/秒, {images / elapsed:.1f} 張/秒", file=sys.stderr)
+
+    summary = run_workbook(args.input, output_path, config, on_result=on_result)
+
+    print(f"完成: {summary.model_count} 個型號 ({len(summary.report_rows)} 列), {summary.download_count} 張圖片, "
+          f"略過 {summary.skipped_count} 次重複下載, 沿用紀錄 {summary.restored_count} 個型號, "
+          f"耗時 {summary.elapsed:.1f} 秒", file=sys.stderr)
+    for row in summary.stage_rows:
+        print(f"{row['階段']}: {row['次數']} 次, 錯誤 {row['錯誤']}, 總耗時 {row['總耗時 (秒)']} 秒, "
+              f"p50 {row['p50 (ms)']} ms, p99 {row['p99 (ms)']} ms", file=sys.stderr)
+    for row in summary.rate_rows:
+        print(f"{row['主機']}: 目前 {row['目前速率 (次/秒)']} 次/秒, 最高 {row['最高速率 (次/秒)']} 次/秒, "
+              f"減速 {row['減速次數']} 次", file=sys.stderr)
+    if summary.index_hit_rate is not None:
+        print(f"商品索引命中率: {summary.index_hit_rate:.1%}", file=sys.stderr)
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as f:
+            json.dump(summary.metrics, f, ensure_ascii=False, indent=2)
+    if args.metrics_prom:
+        with open(args.metrics_prom, 'w', encoding='utf-8') as f:
+            f.write(to_prometheus(summary.metrics))
+    print(output_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+批次引擎
+讀取型號清單並去重複 (ingest.py) → 並行抓取 → 寫入 ZIP 與報表，
+與介面無關，Streamlit 頁面 (app.py) 與命令列 (cli.py) 共用。
+"""
+import io
+import os
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from archive import ArchiveWriter
+from candidates import CandidateFilter
+from image_store import ImageStore
+from ingest import load_plan
+from manifest import RunManifest, DEFAULT_MANIFEST_PATH
+from metrics import StageMetrics, stage_rows, model_rows
+from page_cache import PageCache, DEFAULT_TTL
+from rate_control import AdaptiveRateController, DEFAULT_START_RATE, DEFAULT_MAX_RATE
+from product_index import (ProductIndex, DEFAULT_INDEX_PATH, DEFAULT_INDEX_TTL, DEFAULT_SEEDS, DEFAULT_MAX_PAGES,
+                           DEFAULT_MIN_MISSES)
+from pipeline import BatchPipeline, write_model_to_zip, DEFAULT_CONCURRENCY, DEFAULT_PER_HOST
+
+DEFAULT_DOMAIN = "https://webshop.montbell.jp"
+
+
+@dataclass
+class EngineConfig:
+    """批次設定 (cache_ttl 單位為秒，0 表示停用頁面快取；速率單位為每個主機 次/秒)"""
+    domain: str = DEFAULT_DOMAIN
+    start_rate: float = DEFAULT_START_RATE
+    max_rate: float = DEFAULT_MAX_RATE
+    concurrency: int = DEFAULT_CONCURRENCY
+    per_host: int = DEFAULT_PER_HOST
+    max_image_bytes: int = None
+    cache_ttl: int = DEFAULT_TTL
+    use_image_store: bool = True
+    product_only: bool = True
+    # 執行紀錄：略過已完成的型號與圖片 (需啟用圖片庫)；fresh 為 True 時先清除舊紀錄
+    use_manifest: bool = True
+    manifest_path: str = DEFAULT_MANIFEST_PATH
+    incremental: bool = False
+    fresh: bool = False
+    # 商品索引：過期 (index_ttl 秒) 且需查詢的型號達 index_min_misses 個時，先抓取列表頁
+    use_product_index: bool = True
+    index_path: str = DEFAULT_INDEX_PATH
+    index_ttl: int = DEFAULT_INDEX_TTL
+    index_seeds: tuple = DEFAULT_SEEDS
+    index_max_pages: int = DEFAULT_MAX_PAGES
+    index_min_misses: int = DEFAULT_MIN_MISSES
+
+
+@dataclass
+class BatchSummary:
+    """一次批次執行的結果"""
+    report_rows: list = field(default_factory=list)
+    http_rows: list = field(default_factory=list)
+    cache_rows: list = field(default_factory=list)
+    index_rows: list = field(default_factory=list)
+    index_hit_rate: float = None
+    rate_rows: list = field(default_factory=list)
+    rate_events: list = field(default_factory=list)
+    metrics: dict = field(default_factory=dict)  # StageMetrics.snapshot()
+    stage_rows: list = field(default_factory=list)
+    model_stage_rows: list = field(default_factory=list)
+    logs: list = field(default_factory=list)
+    model_count: int = 0
+    download_count: int = 0
+    skipped_count: int = 0
+    restored_count: int = 0
+    elapsed: float = 0.0
+
+
+class BatchEngine:
+    """依設定建立快取、圖片庫與抓取管線，可重複執行多個批次"""
+
+    def __init__(self, config=None):
+        self.config = config or EngineConfig()
+        c = self.config
+        self.page_cache = PageCache(ttl=c.cache_ttl) if c.cache_ttl else None
+        self.image_store = ImageStore() if c.use_image_store else None
+        self.manifest = RunManifest(c.manifest_path) if c.use_manifest and self.image_store else None
+        if self.manifest and c.fresh:
+            self.manifest.reset()
+        self.product_index = ProductIndex(c.index_path, c.index_ttl) if c.use_product_index else None
+        self.rate = AdaptiveRateController(c.start_rate, c.max_rate)
+        self.metrics = StageMetrics()
+        self.pipeline = BatchPipeline(c.domain, concurrency=c.concurrency, per_host=c.per_host,
+                                      max_image_bytes=c.max_image_bytes, cache=self.page_cache,
+                                      store=self.image_store,
+                                      candidate_filter=CandidateFilter() if c.product_only else None,
+                                      manifest=self.manifest, incremental=c.incremental,
+                                      product_index=self.product_index, rate=self.rate, metrics=self.metrics)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, jobs, archive, report_name=None, on_result=None, plan=None):
+        """
+        處理所有工作並寫入 archive (ArchiveWriter)，回傳 BatchSummary
+        on_result(done, total, result, row) 於呼叫端的執行緒呼叫，可用於更新進度
+        report_name 不為空時將 Excel 報表寫入壓縮檔
+        plan (IngestPlan) 不為空時，報表依原始列展開 (重複型號的每一列都有一筆)
+        """
+        summary = BatchSummary()
+        rows_by_index = {}
+        started = time.perf_counter()
+        self.metrics.reset()  # 計量以批次為單位
+        if self.product_index is not None:
+            self._refresh_index(jobs, summary)
+
+        # === 並行處理，依完成順序寫入 ZIP ===
+        # 中途發生例外 (含 Streamlit 重新執行) 時立即關閉管線，取消其餘型號
+        with closing(self.pipeline.run(jobs)) as results:
+            for done, result in enumerate(results, 1):
+                summary.logs.extend(result.logs)
+                with self.metrics.timer('zip_write', result.model_number) as span:
+                    row = write_model_to_zip(archive, result)
+                    span.bytes = sum(item.size or 0 for item in result.images)
+                rows_by_index[result.index] = row
+                summary.download_count += row["圖片數量"]
+                summary.skipped_count += row["已存在略過下載"]
+                summary.restored_count += result.restored
+
+                if row["圖片數量"] > 0:
+                    summary.logs.append(f"✅ {result.model_number}: {row['圖片數量']} 張 ({row['已取得顏色']})")
+                else:
+                    summary.logs.append(f"⚠️ {result.model_number}: 無圖片")
+                if on_result:
+                    on_result(done, len(jobs), result, row)
+
+        # 報表維持原始列順序
+        summary.model_count = len(rows_by_index)
+        summary.report_rows = [rows_by_index[k] for k in sorted(rows_by_index)]
+        if plan is not None:
+            summary.report_rows = plan.fan_out({row["商品型號"]: row for row in summary.report_rows})
+        summary.http_rows = self.pipeline.stats.rows()
+        summary.cache_rows = self.page_cache.stats.rows() if self.page_cache else []
+        summary.metrics = self.metrics.snapshot()
+        summary.stage_rows = stage_rows(summary.metrics)
+        summary.model_stage_rows = model_rows(summary.metrics)
+        summary.rate_rows = self.rate.rows()
+        summary.rate_events = self.rate.event_rows()
+        if self.product_index is not None:
+            summary.index_rows = self.product_index.stats.rows()
+            summary.index_hit_rate = self.product_index.stats.hit_rate()
+        summary.elapsed = time.perf_counter() - started
+
+        if report_name and summary.report_rows:
+            write_report(archive, report_name, summary)
+        return summary
+
+    def _refresh_index(self, jobs, summary):
+        """索引已過期且需要查詢的型號夠多時，先以列表頁批次更新索引"""
+        c = self.config
+        if not c.index_seeds or not self.product_index.is_stale():
+            return
+        misses = sum(1 for job in jobs if not job.product_url and job.model_number not in self.product_index)
+        if not misses or misses < c.index_min_misses:
+            return
+        models, pages = self.pipeline.prefetch_index(c.index_seeds, max_pages=c.index_max_pages)
+        if models:
+            summary.logs.append(f"🗂️ 商品索引: 抓取 {pages} 頁列表, 收錄 {models} 個型號")
+        else:
+            summary.logs.append(f"⚠️ 商品索引: 列表頁未取得任何型號 (抓取 {pages} 頁)，改為逐筆搜尋")
+
+    def close(self):
+        self.pipeline.client.close()
+        if self.page_cache:
+            self.page_cache.close()
+        if self.image_store:
+            self.image_store.close()
+        if self.manifest:
+            self.manifest.close()
+        if self.product_index is not None:
+            self.product_index.close()
+
+
+def write_report(archive, name, summary):
+    """生成 Excel 報表並寫入壓縮檔"""
+    with io.BytesIO() as excel_buffer:
+        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+            pd.DataFrame(summary.report_rows).to_excel(writer, index=False, sheet_name='下載摘要')
+            if summary.stage_rows:
+                pd.DataFrame(summary.stage_rows).to_excel(writer, index=False, sheet_name='階段耗時')
+            if summary.model_stage_rows:
+                pd.DataFrame(summary.model_stage_rows).to_excel(writer, index=False, sheet_name='型號耗時')
+            if summary.http_rows:
+                pd.DataFrame(summary.http_rows).to_excel(writer, index=False, sheet_name='HTTP統計')
+            if summary.cache_rows:
+                pd.DataFrame(summary.cache_rows).to_excel(writer, index=False, sheet_name='快取統計')
+            if summary.index_rows:
+                pd.DataFrame(summary.index_rows).to_excel(writer, index=False, sheet_name='索引統計')
+            if summary.rate_rows:
+                pd.DataFrame(summary.rate_rows).to_excel(writer, index=False, sheet_name='速率控制')
+            if summary.rate_events:
+                pd.DataFrame(summary.rate_events).to_excel(writer, index=False, sheet_name='減速紀錄')
+        archive.writestr(name, excel_buffer.getvalue())
+
+
+def run_workbook(source, output_path, config=None, on_result=None):
+    """處理整份型號清單 (每個不重複型號抓取一次) 並輸出到 output_path，回傳 BatchSummary"""
+    plan = load_plan(source)
+    stem = os.path.splitext(os.path.basename(str(source)))[0]
+
+    with BatchEngine(config) as engine, ArchiveWriter.create(output_path) as archive:
+        return engine.run(plan.jobs, archive, report_name=f"報表_{stem}.xlsx", on_result=on_result, plan=plan)
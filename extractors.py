@@ -0,0 +1,232 @@
+"""
+高速圖片提取引擎
+以 lxml (libxml2) 解析商品頁一次，並以單次走訪取代原始邏輯的五次 CSS 選擇器；
+去重複改用 set 查詢。輸出的 URL 與順序與 scraper.original_extract_images_from_html /
+original_extract_images_from_js 相同 (JS 另會補上原始規則不支援的寫法)，原始函數保留作為比對基準
+(僅在 HTML 結構錯誤、例如巢狀 <a> 時，libxml2 與 html.parser 的修復方式不同可能造成差異)。
+效能比較見 benchmarks/bench_extract.py 與 benchmarks/bench_js.py。
+"""
+import re
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+HIDDEN_AREA_IDS = {'img_hidden_pre', 'img_hidden_later'}
+
+
+def parse_html(content):
+    """解析商品頁 (bytes 或 str)，回傳 lxml 樹；提取函數皆接受此物件"""
+    try:
+        return lxml.html.fromstring(content)
+    except etree.ParserError:
+        # 空白頁面：與 html.parser 相同，視為沒有任何元素
+        return lxml.html.fromstring('<html></html>')
+
+
+def _absolute(url, base_url):
+    if not url.startswith(('http://', 'https://')):
+        return urljoin(base_url, url)
+    return url
+
+
+def _has_class(element, name):
+    return name in (element.get('class') or '').split()
+
+
+class _OrderedUrls:
+    """保持插入順序的 URL 集合"""
+
+    def __init__(self):
+        self.urls = []
+        self._seen = set()
+
+    def append(self, url):
+        # 原始邏輯中 fancy_largelink 的 href 不檢查重複，保留此行為
+        self.urls.append(url)
+        self._seen.add(url)
+
+    def add(self, url):
+        if url not in self._seen:
+            self.urls.append(url)
+            self._seen.add(url)
+
+
+def extract_images_from_html(tree, base_url):
+    """
+    從HTML頁面提取圖片URL (單次走訪)
+    走訪時依原始邏輯的五個步驟分別收集，最後依步驟順序合併
+    """
+    fancy_links = []     # 1. [href, 第一張 img 的 src]
+    hidden_srcs = []     # 2. 隱藏區域
+    main_src = None      # 3. 主圖 (第一個 #largelinkImg)
+    main_found = False
+    thumb_srcs = []      # 4. 縮略圖區域
+    all_srcs = []        # 5. 所有 img[src]
+
+    open_links = []      # 尚未找到 img 的 fancy_largelink
+    hidden_depth = 0
+    thumb_depth = 0
+
+    for event, element in etree.iterwalk(tree, events=('start', 'end')):
+        tag = element.tag
+        if not isinstance(tag, str):
+            continue  # 註解等節點
+
+        if event == 'end':
+            if tag == 'a' and open_links and open_links[-1][2] is element:
+                open_links.pop()
+            if element.get('id') in HIDDEN_AREA_IDS:
+                hidden_depth -= 1
+            if _has_class(element, 'cutImglArea'):
+                thumb_depth -= 1
+            continue
+
+        if not main_found and element.get('id') == 'largelinkImg':
+            main_found = True
+            main_src = element.get('src')
+
+        if tag == 'img':
+            src = element.get('src')
+            for record in open_links:
+                if record[1] is None:
+                    record[1] = src if src is not None else ''
+            if hidden_depth and src:
+                hidden_srcs.append(src)
+            if thumb_depth and src:
+                thumb_srcs.append(src)
+            if src is not None:
+                all_srcs.append(src)
+        elif tag == 'a' and _has_class(element, 'fancy_largelink'):
+            record = [element.get('href'), None, element]
+            fancy_links.append(record)
+            open_links.append(record)
+
+        # 區域標記在處理自身之後才生效 (選擇器只比對子孫元素)
+        if element.get('id') in HIDDEN_AREA_IDS:
+            hidden_depth += 1
+        if _has_class(element, 'cutImglArea'):
+            thumb_depth += 1
+
+    image_urls = _OrderedUrls()
+
+    # 1. 從fancy_largelink元素提取圖片
+    for hd_img_url, img_url, _ in fancy_links:
+        if hd_img_url:
+            image_urls.append(_absolute(hd_img_url, base_url))
+        if img_url:
+            image_urls.add(_absolute(img_url, base_url))
+
+    # 2. 從隱藏區域獲取圖片
+    for img_url in hidden_srcs:
+        image_urls.add(_absolute(img_url, base_url))
+
+    # 3. 獲取主圖
+    if main_src:
+        image_urls.add(_absolute(main_src, base_url))
+
+    # 4. 從縮略圖區域獲取圖片 (含高解析度版本)
+    for img_url in thumb_srcs:
+        img_url = _absolute(img_url, base_url)
+        image_urls.add(img_url)
+        if '/cut_c/' in img_url:
+            image_urls.add(img_url.replace('/cut_c/', '/cut_k/').replace('cc_', 'ck_'))
+        elif '/prod_c/' in img_url:
+            image_urls.add(img_url.replace('/prod_c/', '/prod_k/').replace('c_', 'k_'))
+
+    # 5. 從所有img標籤提取圖片
+    for img_url in all_srcs:
+        if img_url and any(ext in img_url.lower() for ext in IMAGE_EXTENSIONS):
+            image_urls.add(_absolute(img_url, base_url))
+
+    return image_urls.urls
+
+
+def _script_texts(tree):
+    for script in tree.iter('script'):
+        if script.text:
+            yield script.text
+
+
+# cimages / kimages / cimage_paths / kimage_paths 的賦值，兩種寫法合併為一條規則：
+#   cimages['BK'] = 'c_xxx.jpg';  (單/雙引號皆可，同一行可有多個賦值)
+#   cimages = {'BK': 'c_xxx.jpg', "NV": "c_yyy.jpg"};
+# 規則以字面 "image" 開頭，re 可直接以字串搜尋定位，表名的 c/k 前綴改以 lookbehind 確認；
+# 與原始規則相同不檢查識別字邊界 (xcimages[...] 等亦會符合)
+_JS_TABLE = re.compile(
+    r"""image(?<=[ck]image)(s|_paths)\s*"""
+    r"""(?:\[\s*(['"])([^'"]+)\2\s*\]\s*=\s*(['"])([^'"]+)\4|=\s*\{([^{}]*)\})""")
+_JS_OBJECT_ITEM = re.compile(r"""(['"])([^'"]+)\1\s*:\s*(['"])([^'"]+)\3""")
+# 原始規則可比對的寫法 (單引號、不跨行)
+_JS_ORIGINAL_FORM = re.compile(r"""image(?:s|_paths)\['[^'\n]+'\][^\S\n]*=[^\S\n]*'[^'\n]+'""")
+# 原始邏輯在每一行依此順序各取第一個符合的賦值
+_JS_TABLE_ORDER = {'cimages': 0, 'kimages': 1, 'cimage_paths': 2, 'kimage_paths': 3}
+
+
+def _js_table_entries(script_text):
+    """依出現順序產出 (表名, key, value, 行號, 是否為原始規則可比對的寫法)"""
+    line = pos = 0
+    for m in _JS_TABLE.finditer(script_text):
+        line += script_text.count('\n', pos, m.start())
+        pos = m.start()
+        table = script_text[m.start() - 1] + 'image' + m.group(1)
+        if m.group(6) is None:
+            yield table, m.group(3), m.group(5), line, _JS_ORIGINAL_FORM.fullmatch(m.group(0)) is not None
+        else:
+            for item in _JS_OBJECT_ITEM.finditer(m.group(6)):
+                yield table, item.group(2), item.group(4), line, False
+
+
+def extract_images_from_js(tree, base_url):
+    """
+    從JavaScript提取圖片URL (cimages / kimages 表)
+    每個腳本以預先編譯的規則 finditer 掃描一次，取代原始邏輯逐行呼叫四次 re.search；
+    原始寫法沿用原始邏輯的語意 (每行每個表只取第一個賦值，依 cimages / kimages / 路徑 的順序處理)，
+    另支援雙引號、同一行多個賦值與物件實字寫法，這些只補上原始邏輯未取得的項目
+    """
+    image_urls = []
+    image_data = {}
+    image_paths = {}
+
+    def assign(table, key, value):
+        if table == 'cimages':
+            image_data.setdefault(key, {})['cimage'] = value
+        elif table == 'kimages':
+            image_data.setdefault(key, {})['kimage'] = value
+        else:
+            image_paths[f'{table}_{key}'] = value
+
+    primary = []
+    extra = []
+    first = set()
+    for script_no, script_text in enumerate(_script_texts(tree)):
+        if 'cimages' not in script_text and 'kimages' not in script_text:
+            continue
+        for table, key, value, line, original in _js_table_entries(script_text):
+            if original and (script_no, line, table) not in first:
+                first.add((script_no, line, table))
+                primary.append(((script_no, line, _JS_TABLE_ORDER[table]), table, key, value))
+            else:
+                extra.append((table, key, value))
+
+    primary.sort(key=lambda entry: entry[0])
+    for _, table, key, value in primary:
+        assign(table, key, value)
+    assigned = {(table, key) for _, table, key, _ in primary}
+    for table, key, value in extra:
+        if (table, key) not in assigned:
+            assign(table, key, value)
+
+    for key, data in image_data.items():
+        if 'cimage' in data:
+            cimage_path = image_paths.get(f'cimage_paths_{key}', '/common/images/product/prod_c')
+            cimage_url = f"{base_url}{cimage_path}/{data['cimage']}"
+            image_urls.append(cimage_url.replace('https://webshop.montbell.jp//', 'https://webshop.montbell.jp/'))
+
+        if 'kimage' in data:
+            kimage_path = image_paths.get(f'kimage_paths_{key}', '/common/images/product/prod_k')
+            kimage_url = f"{base_url}{kimage_path}/{data['kimage']}"
+            image_urls.append(kimage_url.replace('https://webshop.montbell.jp//', 'https://webshop.montbell.jp/'))
+
+    return image_urls
@@ -0,0 +1,147 @@
+"""
+共用 HTTP 連線層
+以單一 requests.Session 重複使用 TCP/TLS 連線，所有請求皆有逾時，
+遇到 5xx / 429 / 連線中斷時以指數退避 + 隨機抖動重試，並依階段統計重試與失敗次數。
+設定 rate (AdaptiveRateController) 時，每次嘗試前先取得該主機的權杖，並回報結果以調整速率。
+並發名額 (slot) 只在請求進行中佔用，等待權杖與重試退避時不佔用名額。
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraper import get_original_headers
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+DEFAULT_TIMEOUT = (5, 30)  # (連線, 讀取) 秒
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30
+
+
+class HttpStats:
+    """依階段 (search / product / image ...) 統計請求、重試與失敗次數"""
+
+    FIELDS = ('requests', 'retries', 'failures')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, stage, name, n=1):
+        with self._lock:
+            counters = self._stages.setdefault(stage, dict.fromkeys(self.FIELDS, 0))
+            counters[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self._stages.items()}
+
+    def rows(self):
+        """轉為報表列 (每個階段一列)"""
+        return [
+            {"階段": stage, "請求數": c['requests'], "重試次數": c['retries'], "失敗次數": c['failures']}
+            for stage, c in sorted(self.snapshot().items())
+        ]
+
+
+class HttpClient:
+    """
+    具連線池與重試機制的 HTTP 用戶端
+    Session 預設帶入原始腳本的 Headers，各請求只需覆寫 Referer / Accept
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX, rate=None):
+        self.timeout = timeout
+        self.rate = rate
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = HttpStats()
+
+        self.session = requests.Session()
+        self.session.headers.update(get_original_headers())
+        # 重試由本層處理 (需要統計與抖動)，adapter 本身不重試
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def backoff(self, attempt):
+        """指數退避 + 完全抖動 (full jitter)"""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def request(self, method, url, stage='default', slot=None, **kwargs):
+        """
+        slot(url) 為並發名額 (context manager)，每次嘗試送出請求時才取得；
+        串流回應 (stream=True) 的名額保留到回應關閉，其餘回應收到後即釋放
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.stats.add(stage, 'requests')
+            if self.rate is not None:
+                self.rate.acquire(url)  # 等待時不佔用名額
+            held = ExitStack()
+            if slot is not None:
+                held.enter_context(slot(url))
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                held.close()
+                if self.rate is not None:
+                    self.rate.record(url)
+                if attempt >= self.max_retries:
+                    self.stats.add(stage, 'failures')
+                    raise
+            except BaseException:
+                held.close()
+                raise
+            else:
+                if self.rate is not None:
+                    # 串流請求的延遲為收到回應標頭的時間
+                    self.rate.record(url, response.status_code, time.monotonic() - started,
+                                     response.headers.get('Retry-After'))
+                if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    if response.status_code in RETRY_STATUS:
+                        self.stats.add(stage, 'failures')
+                    if kwargs.get('stream'):
+                        _release_on_close(response, held)
+                    else:
+                        held.close()
+                    return response
+                response.close()
+                held.close()
+
+            self.stats.add(stage, 'retries')
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def get(self, url, stage='default', **kwargs):
+        return self.request('GET', url, stage=stage, **kwargs)
+
+    def head(self, url, stage='default', **kwargs):
+        return self.request('HEAD', url, stage=stage, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _release_on_close(response, held):
+    """串流回應關閉 (讀取完畢或放棄) 時才釋放名額"""
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            held.close()
+    response.close = close_and_release
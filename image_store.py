@@ -0,0 +1,110 @@
+"""
+內容定址的本機圖片庫
+圖片以 SHA-256 存放於 objects/ 目錄，並以 SQLite 記錄 URL → 雜湊；
+任何先前批次或執行已下載過的 URL 直接由本機取用，不再重新下載，
+不同 URL 但內容相同的圖片在磁碟上也只保存一份。
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'montbell_downloader', 'images')
+
+StoredImage = namedtuple('StoredImage', 'sha256 content_type size')
+
+
+class ImageStore:
+    """URL / 內容雜湊雙索引的圖片庫 (執行緒安全)"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self._objects = os.path.join(root, 'objects')
+        self._tmp = os.path.join(root, 'tmp')
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._tmp, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def object_path(self, sha256):
+        return os.path.join(self._objects, sha256[:2], sha256)
+
+    @contextmanager
+    def claim(self, url):
+        """同一個 URL 同時只允許一個執行緒下載，其餘等待後直接取用結果"""
+        with self._lock:
+            entry = self._claims.get(url)
+            if entry is None:
+                entry = self._claims[url] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._claims[url]
+
+    def lookup(self, url):
+        """回傳 StoredImage；URL 未下載過或檔案已遺失時回傳 None"""
+        with self._lock:
+            row = self._conn.execute('SELECT sha256, content_type, size FROM urls WHERE url = ?', (url,)).fetchone()
+        if row is None or not os.path.exists(self.object_path(row[0])):
+            return None
+        return StoredImage(*row)
+
+    def has(self, sha256):
+        return os.path.exists(self.object_path(sha256))
+
+    def open(self, sha256):
+        return open(self.object_path(sha256), 'rb')
+
+    def new_file(self):
+        """下載用的暫存檔 (與 objects/ 同一檔案系統，完成後可直接改名)"""
+        return tempfile.NamedTemporaryFile(dir=self._tmp, delete=False)
+
+    def commit(self, url, tmp_file, sha256, content_type):
+        """將下載完成的暫存檔納入圖片庫並記錄 URL"""
+        tmp_file.close()
+        size = os.path.getsize(tmp_file.name)
+        path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_file.name)  # 相同內容已存在
+        else:
+            os.replace(tmp_file.name, path)
+
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)',
+                               (url, sha256, content_type, size, time.time()))
+            self._conn.commit()
+        return StoredImage(sha256, content_type, size)
+
+    @staticmethod
+    def discard(tmp_file):
+        tmp_file.close()
+        try:
+            os.remove(tmp_file.name)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,168 @@
+"""
+型號清單讀取與工作規劃
+在任何網路請求之前：
+1. 以串流方式讀取清單，只保留型號欄與網址欄
+   (xlsx 使用 openpyxl 唯讀模式逐列讀取；CSV 以 usecols 只解析需要的欄位)
+2. 以向量化方式正規化型號 (全形轉半形、去除空白、統一大寫、Excel 數字 1128001.0 → 1128001) 與網址
+3. 依正規化後的型號去重複，每個不重複型號只建立一個工作 (網址取第一個非空白值)
+4. 報表再依原始列展開，重複的列沿用同一型號的結果
+"""
+import io
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+
+from pipeline import ModelJob
+
+MODEL_KEYWORDS = ('型號', 'model', 'id')
+URL_KEYWORDS = ('網址', 'url', 'link')
+BLANK_VALUES = ('', 'NAN', 'NONE', 'NULL')
+FIRST_DATA_ROW = 2  # 第 1 列為標題
+
+
+def detect_columns(columns):
+    """欄位偵測：回傳 (型號欄, 網址欄或 None)"""
+    columns = list(columns)
+    model_col = next((c for c in columns if any(x in str(c).lower() for x in MODEL_KEYWORDS)), columns[0])
+    url_col = next((c for c in columns if any(x in str(c).lower() for x in URL_KEYWORDS)), None)
+    return model_col, url_col
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _read_xlsx(source):
+    """openpyxl 唯讀模式逐列讀取，只保留型號欄與網址欄"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return pd.DataFrame(columns=['model', 'url'])
+        header = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        model_col, url_col = detect_columns(header)
+        model_idx = header.index(model_col)
+        url_idx = header.index(url_col) if url_col is not None else None
+
+        models, urls = [], []
+        for row in rows:
+            models.append(row[model_idx] if model_idx < len(row) else None)
+            urls.append(row[url_idx] if url_idx is not None and url_idx < len(row) else None)
+    finally:
+        workbook.close()
+    return pd.DataFrame({'model': pd.Series(models, dtype=object), 'url': pd.Series(urls, dtype=object)})
+
+
+def _read_csv(source):
+    """先讀標題偵測欄位，再以 usecols 只解析型號欄與網址欄 (全部視為文字)"""
+    if not isinstance(source, (str, os.PathLike)):
+        # 上傳的檔案物件需讀兩次 (標題 + 內容)
+        _rewind(source)
+        source = io.BytesIO(source.read())
+    header = pd.read_csv(source, nrows=0).columns
+    _rewind(source)
+    model_col, url_col = detect_columns(header)
+    usecols = [model_col] + ([url_col] if url_col is not None else [])
+    df = pd.read_csv(source, usecols=usecols, dtype=str, keep_default_na=False)
+    return pd.DataFrame({'model': df[model_col], 'url': df[url_col] if url_col is not None else None})
+
+
+def read_table(source, filename=None):
+    """
+    讀取型號清單，回傳只有 model / url 兩欄的 DataFrame (原始值，依原始列順序)
+    source 可為路徑或檔案物件 (如 Streamlit 上傳的檔案)
+    """
+    name = (filename or getattr(source, 'name', None) or str(source)).lower()
+    if name.endswith('.csv'):
+        return _read_csv(source)
+    if name.endswith('.xls'):
+        # 舊版 xls 無法串流讀取，改用 pandas 讀取後再取需要的欄位
+        df = pd.read_excel(source, dtype=object)
+        model_col, url_col = detect_columns(df.columns)
+        return pd.DataFrame({'model': df[model_col], 'url': df[url_col] if url_col is not None else None})
+    return _read_xlsx(source)
+
+
+def _text(values):
+    """轉為去除前後空白的文字，空值為空字串；Excel 數字型號 (1128001.0) 去掉小數點"""
+    values = pd.Series(values, dtype=object)
+    text = values.where(values.notna(), '').astype(str).str.strip()
+    return text.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+
+def normalize_models(values):
+    """型號正規化：全形轉半形、移除所有空白、統一大寫；空白值為 None"""
+    text = _text(values).str.normalize('NFKC').str.replace(r'\s+', '', regex=True).str.upper()
+    return text.where(~text.isin(BLANK_VALUES), None)
+
+
+def normalize_urls(values):
+    text = _text(values)
+    return text.where(~text.str.upper().isin(BLANK_VALUES), None)
+
+
+@dataclass
+class IngestPlan:
+    """
+    jobs: 每個不重複型號一個 ModelJob (依首次出現順序)
+    rows: 原始列 (列號 / 原始型號 / 正規化型號 key / 是否重複)，用於展開報表
+    """
+    jobs: list
+    rows: pd.DataFrame
+
+    @property
+    def total_rows(self):
+        return len(self.rows)
+
+    @property
+    def blank_rows(self):
+        return int(self.rows['key'].isna().sum())
+
+    @property
+    def duplicate_rows(self):
+        return int(self.rows['duplicate'].sum())
+
+    def slice(self, start, end):
+        """依不重複型號分批 (第 start ~ end-1 個型號)，只保留相關的原始列"""
+        jobs = self.jobs[start:end]
+        keys = [job.model_number for job in jobs]
+        return IngestPlan(jobs, self.rows[self.rows['key'].isin(keys)])
+
+    def fan_out(self, rows_by_model):
+        """將每個型號的報表列展開回原始列 (空白型號的列略過)"""
+        report = []
+        for row_no, raw, key, duplicate in self.rows[['row', 'raw', 'key', 'duplicate']].itertuples(index=False):
+            base = rows_by_model.get(key)
+            if base is None:
+                continue
+            report.append({"列號": row_no, "原始型號": raw, **base, "重複列": "是" if duplicate else ""})
+        return report
+
+
+def plan_jobs(table):
+    """由 read_table 的結果建立 IngestPlan"""
+    keys = normalize_models(table['model'])
+    urls = normalize_urls(table['url']) if 'url' in table else pd.Series(None, index=table.index, dtype=object)
+    rows = pd.DataFrame({
+        'row': range(FIRST_DATA_ROW, FIRST_DATA_ROW + len(table)),
+        'raw': _text(table['model']).values,
+        'key': keys.values,
+        'url': urls.values,
+    })
+    valid = rows[rows['key'].notna()]
+    rows['duplicate'] = valid['key'].duplicated().reindex(rows.index, fill_value=False)
+
+    # 每個型號取第一個非空白網址
+    first_urls = valid[valid['url'].notna()].drop_duplicates('key').set_index('key')['url']
+    jobs = [ModelJob(i, key, first_urls.get(key)) for i, key in enumerate(valid['key'].drop_duplicates())]
+    return IngestPlan(jobs, rows.drop(columns='url'))
+
+
+def load_plan(source, filename=None):
+    """讀取清單並規劃工作"""
+    return plan_jobs(read_table(source, filename))
@@ -0,0 +1,121 @@
+"""
+執行紀錄 (SQLite)
+記錄每個型號解析出的商品頁、候選圖片與下載狀態 (大小、雜湊)，
+批次中斷後重新執行時可略過已完成的型號與圖片 (圖片內容由 ImageStore 提供)；
+增量模式則只重新檢查商品頁，圖片清單沒有變更的型號直接沿用。
+每個型號同時記錄抓取設定的指紋 (網域、圖片篩選規則、大小上限)，設定不同時視為未完成。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'montbell_downloader', 'manifest.sqlite3')
+MANIFEST_DIR = os.path.dirname(DEFAULT_MANIFEST_PATH)
+
+# 圖片狀態：done 已下載 / missing 不存在或非圖片 (不需重試) / failed 暫時性失敗 (下次重試)
+IMAGE_DONE = 'done'
+IMAGE_MISSING = 'missing'
+IMAGE_FAILED = 'failed'
+
+ModelRecord = namedtuple('ModelRecord', 'product_urls search_url signature complete updated_at settings')
+ImageRecord = namedtuple('ImageRecord', 'img_idx urls url filename status size sha256')
+
+
+def image_signature(image_urls):
+    """商品頁的指紋：以提取出的圖片網址計算，避免庫存數量等動態內容造成誤判"""
+    return hashlib.sha256('\n'.join(image_urls).encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint(**settings):
+    """影響抓取結果的設定指紋 (值需可轉為 JSON)"""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def workbook_manifest_path(filename, directory=MANIFEST_DIR):
+    """依型號清單檔名決定的執行紀錄路徑 (每份清單各自一份紀錄)"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(directory, f"montbell_{stem}.manifest.sqlite3")
+
+
+class RunManifest:
+    """以型號為鍵的執行紀錄 (執行緒安全)"""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS models (
+                model_number TEXT PRIMARY KEY,
+                product_urls TEXT NOT NULL,
+                search_url TEXT,
+                signature TEXT,
+                complete INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                settings TEXT
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                model_number TEXT NOT NULL,
+                key TEXT NOT NULL,
+                img_idx INTEGER NOT NULL,
+                urls TEXT NOT NULL,
+                url TEXT,
+                filename TEXT,
+                status TEXT NOT NULL,
+                size INTEGER,
+                sha256 TEXT,
+                PRIMARY KEY (model_number, key)
+            );
+        ''')
+        # 舊版紀錄沒有設定指紋欄位 (舊紀錄一律視為設定不同)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(models)')}
+        if 'settings' not in columns:
+            self._conn.execute('ALTER TABLE models ADD COLUMN settings TEXT')
+        self._conn.commit()
+
+    def get_model(self, model_number):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT product_urls, search_url, signature, complete, updated_at, settings FROM models '
+                'WHERE model_number = ?', (model_number,)).fetchone()
+        if row is None:
+            return None
+        return ModelRecord(json.loads(row[0]), row[1], row[2], bool(row[3]), row[4], row[5])
+
+    def get_images(self, model_number):
+        """回傳 {候選圖片鍵 (最高解析度 URL): ImageRecord}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, img_idx, urls, url, filename, status, size, sha256 FROM images WHERE model_number = ?',
+                (model_number,)).fetchall()
+        return {row[0]: ImageRecord(row[1], json.loads(row[2]), *row[3:]) for row in rows}
+
+    def record_model(self, model_number, product_urls, search_url, signature, complete, images, settings=None):
+        """以單一交易覆寫該型號的紀錄；images 為 ImageRecord 清單，settings 為 settings_fingerprint()"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (model_number, json.dumps(product_urls), search_url, signature, int(complete), time.time(),
+                 settings))
+            self._conn.execute('DELETE FROM images WHERE model_number = ?', (model_number,))
+            self._conn.executemany(
+                'INSERT INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(model_number, image.urls[0], image.img_idx, json.dumps(image.urls), image.url, image.filename,
+                  image.status, image.size, image.sha256) for image in images])
+
+    def reset(self):
+        """清除所有紀錄 (重新開始)"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM images')
+            self._conn.execute('DELETE FROM models')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,170 @@
+"""
+各階段計量
+記錄 搜尋 / 商品頁 / HTML 解析 / JS 解析 / 候選篩選 / 圖片下載 / 寫入 ZIP 的
+次數、位元組、錯誤與延遲分布 (固定區間直方圖)，分別依批次與型號彙總。
+snapshot() 為可直接轉 JSON 的 dict，報表列與 Prometheus 文字格式皆由 snapshot 產生。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 階段 (依處理順序) 與報表顯示名稱
+STAGES = ('search', 'product', 'html_parse', 'js_parse', 'candidates', 'image', 'zip_write')
+STAGE_LABELS = {
+    'search': '搜尋',
+    'product': '商品頁',
+    'html_parse': 'HTML 解析',
+    'js_parse': 'JS 解析',
+    'candidates': '候選篩選',
+    'image': '圖片下載',
+    'zip_write': '寫入 ZIP',
+}
+
+# 直方圖區間上限 (秒)，最後一格為無限大
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_PREFIX = 'montbell_stage'
+
+
+class Span:
+    """一次計時中可補充的資訊"""
+    __slots__ = ('bytes', 'error')
+
+    def __init__(self):
+        self.bytes = 0
+        self.error = False
+
+
+def _new_stage():
+    return {'count': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0, 'max': 0.0,
+            'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+
+
+class StageMetrics:
+    """依階段與型號累計的計量 (執行緒安全)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._models = {}
+
+    def record(self, stage, seconds, nbytes=0, error=False, model=None):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = _new_stage()
+            s['count'] += 1
+            s['errors'] += bool(error)
+            s['bytes'] += nbytes
+            s['seconds'] += seconds
+            s['max'] = max(s['max'], seconds)
+            s['buckets'][bucket] += 1
+            if model is not None:
+                m = self._models.setdefault(model, {}).setdefault(stage, [0, 0.0, 0, 0])
+                m[0] += 1
+                m[1] += seconds
+                m[2] += nbytes
+                m[3] += bool(error)
+
+    @contextmanager
+    def timer(self, stage, model=None):
+        """計時區塊；區塊內可設定 span.bytes / span.error，發生例外時記為錯誤"""
+        span = Span()
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, span.bytes, span.error, model)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'stages': {stage: dict(s, buckets=list(s['buckets'])) for stage, s in self._stages.items()},
+                'models': {model: {stage: dict(zip(('count', 'seconds', 'bytes', 'errors'), v))
+                                   for stage, v in stages.items()}
+                           for model, stages in self._models.items()},
+                'buckets': list(LATENCY_BUCKETS),
+            }
+
+
+def _ordered(stages):
+    return sorted(stages, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s))
+
+
+def estimate_percentile(stage, p):
+    """由直方圖估計百分位數 (取所在區間上限，不超過實際最大值)，單位秒"""
+    if not stage['count']:
+        return 0.0
+    target = stage['count'] * p / 100
+    cumulative = 0
+    for i, n in enumerate(stage['buckets']):
+        cumulative += n
+        if cumulative >= target:
+            return min(LATENCY_BUCKETS[i], stage['max']) if i < len(LATENCY_BUCKETS) else stage['max']
+    return stage['max']
+
+
+def stage_rows(snapshot):
+    """批次彙總報表列 (每個階段一列)，時間單位為毫秒"""
+    rows = []
+    for name in _ordered(snapshot['stages']):
+        s = snapshot['stages'][name]
+        rows.append({
+            "階段": STAGE_LABELS.get(name, name),
+            "次數": s['count'],
+            "錯誤": s['errors'],
+            "位元組": s['bytes'],
+            "總耗時 (秒)": round(s['seconds'], 3),
+            "平均 (ms)": round(s['seconds'] / s['count'] * 1000, 2) if s['count'] else 0,
+            "p50 (ms)": round(estimate_percentile(s, 50) * 1000, 2),
+            "p90 (ms)": round(estimate_percentile(s, 90) * 1000, 2),
+            "p99 (ms)": round(estimate_percentile(s, 99) * 1000, 2),
+            "最大 (ms)": round(s['max'] * 1000, 2),
+        })
+    return rows
+
+
+def model_rows(snapshot):
+    """型號明細報表列：各階段耗時 (毫秒) 與下載位元組"""
+    stages = _ordered({stage for m in snapshot['models'].values() for stage in m})
+    rows = []
+    for model, m in snapshot['models'].items():
+        row = {"商品型號": model}
+        for stage in stages:
+            row[f"{STAGE_LABELS.get(stage, stage)} (ms)"] = round(m[stage]['seconds'] * 1000, 2) if stage in m else 0
+        row["錯誤"] = sum(s['errors'] for s in m.values())
+        row["圖片位元組"] = m['image']['bytes'] if 'image' in m else 0
+        rows.append(row)
+    return rows
+
+
+def to_prometheus(snapshot, prefix=PROMETHEUS_PREFIX):
+    """轉為 Prometheus 文字格式 (直方圖 + 錯誤與位元組計數)"""
+    lines = [
+        f'# HELP {prefix}_duration_seconds Stage latency.',
+        f'# TYPE {prefix}_duration_seconds histogram',
+    ]
+    stages = _ordered(snapshot['stages'])
+    for name in stages:
+        s = snapshot['stages'][name]
+        cumulative = 0
+        for bound, n in zip(list(snapshot['buckets']) + ['+Inf'], s['buckets']):
+            cumulative += n
+            lines.append(f'{prefix}_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_duration_seconds_sum{{stage="{name}"}} {s["seconds"]:.6f}')
+        lines.append(f'{prefix}_duration_seconds_count{{stage="{name}"}} {s["count"]}')
+    for metric, key, help_text in (('errors_total', 'errors', 'Stage errors.'),
+                                   ('bytes_total', 'bytes', 'Bytes handled by the stage.')):
+        lines.append(f'# HELP {prefix}_{metric} {help_text}')
+        lines.append(f'# TYPE {prefix}_{metric} counter')
+        lines.extend(f'{prefix}_{metric}{{stage="{name}"}} {snapshot["stages"][name][key]}' for name in stages)
+    return '\n'.join(lines) + '\n'
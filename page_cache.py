@@ -0,0 +1,141 @@
+"""
+搜尋頁 / 商品頁的本機回應快取
+以 SQLite 保存於磁碟，Streamlit 重新執行或再次跑同一批次時可直接重用；
+超過有效時間 (TTL) 的項目會以 ETag / Last-Modified 發出條件式請求，
+伺服器回 304 時沿用快取內容；總大小超過上限時依最近使用時間 (LRU) 淘汰。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from http_client import HttpStats
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'montbell_downloader', 'pages.sqlite3')
+DEFAULT_TTL = 6 * 60 * 60  # 秒
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# 只保存重用時需要的標頭
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class CacheStats(HttpStats):
+    """依階段統計快取命中 / 重新驗證 / 未命中次數"""
+
+    FIELDS = ('hits', 'revalidated', 'misses')
+
+    def rows(self):
+        return [
+            {"階段": stage, "命中": c['hits'], "304 重新驗證": c['revalidated'], "未命中": c['misses']}
+            for stage, c in sorted(self.snapshot().items())
+        ]
+
+
+class CachedPage:
+    """快取中的頁面，提供與 requests.Response 相同的 content / status_code / url / headers"""
+
+    def __init__(self, url, status_code, content, headers):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+
+
+class PageCache:
+    """以 URL + 查詢參數為鍵的磁碟快取 (執行緒安全)"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)')
+        self._conn.commit()
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    @staticmethod
+    def make_key(url, params=None):
+        """以 requests 組出的完整 URL 作為鍵，參數順序與編碼與實際請求一致"""
+        return requests.Request('GET', url, params=params).prepare().url
+
+    def lookup(self, key):
+        """回傳 (CachedPage, 是否仍在有效期內)；無快取時回傳 (None, False)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, status, content_type, etag, last_modified, body, fetched_at FROM pages WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None, False
+            self._conn.execute('UPDATE pages SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+
+        url, status, content_type, etag, last_modified, body, fetched_at = row
+        headers = {name: value for name, value in zip(KEPT_HEADERS, (content_type, etag, last_modified)) if value}
+        return CachedPage(url, status, body, headers), (now - fetched_at) < self.ttl
+
+    @staticmethod
+    def conditional_headers(page):
+        headers = {}
+        if page.headers.get('ETag'):
+            headers['If-None-Match'] = page.headers['ETag']
+        if page.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = page.headers['Last-Modified']
+        return headers
+
+    def store(self, key, response):
+        body = response.content
+        now = time.time()
+        values = [response.headers.get(name) for name in KEPT_HEADERS]
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url, response.status_code, *values, body, len(body), now, now))
+            self._total += len(body) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, key):
+        """伺服器回 304：重設有效期限"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+            self._conn.commit()
+
+    def _evict(self):
+        # 呼叫端需持有 self._lock
+        if self._total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT key, size FROM pages ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+            self._total -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,541 @@
+"""
+並行抓取管線
+將原本逐一執行的 搜尋 → 商品頁 → 圖片下載 拆成獨立階段，
+以有上限的執行緒池並行處理，並限制全域與每個主機的同時連線數；
+請求速率由 AdaptiveRateController 依伺服器回應自動調整。
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from candidates import select_candidates
+from extractors import parse_html, extract_images_from_html, extract_images_from_js
+from http_client import HttpClient, RETRY_STATUS
+from metrics import StageMetrics
+from manifest import ImageRecord, IMAGE_DONE, IMAGE_MISSING, IMAGE_FAILED, image_signature, settings_fingerprint
+from product_index import crawl, DEFAULT_LIST_PATTERN, DEFAULT_MAX_PAGES
+from rate_control import AdaptiveRateController
+from scraper import extract_color_code
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 4
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024  # 單張圖片超過此大小即暫存到磁碟
+
+
+@dataclass
+class ModelJob:
+    """單一型號的工作項目 (index 為在批次中的原始順序)"""
+    index: int
+    model_number: str
+    product_url: str = None
+
+
+@dataclass
+class ModelResult:
+    """單一型號的處理結果，圖片依 img_idx 排序"""
+    index: int
+    model_number: str
+    images: list = field(default_factory=list)  # [ImageItem]
+    logs: list = field(default_factory=list)
+    complete: bool = True  # 沒有暫時性失敗 (可記為已完成)
+    restored: bool = False  # 是否直接沿用執行紀錄 (未重新抓取)
+    indexed: bool = False  # 商品頁網址是否來自商品索引 (未搜尋)
+
+    def close(self):
+        """釋放尚未寫入 ZIP 的下載暫存檔"""
+        for item in self.images:
+            if item.body is not None:
+                item.body.close()
+
+
+@dataclass
+class ImageItem:
+    """
+    已取得的單張圖片：body 為下載的暫存檔，或 path 為圖片庫中的檔案
+    圖片庫檔案在寫入 ZIP 時才開啟，大量型號沿用紀錄時不會同時佔用檔案描述元
+    """
+    img_idx: int
+    filename: str
+    body: object
+    sha256: str
+    reused: bool = False  # 是否由圖片庫取用 (未重新下載)
+    url: str = None
+    size: int = None
+    path: str = None
+
+    def open(self):
+        """回傳可讀取的檔案物件 (由呼叫端關閉)"""
+        return self.body if self.body is not None else open(self.path, 'rb')
+
+
+class ConcurrencyLimiter:
+    """全域並發上限 + 每個主機的並發上限"""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST):
+        self.per_host = max(1, int(per_host))
+        self._global = threading.BoundedSemaphore(max(1, int(concurrency)))
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            sem = self._hosts.get(host)
+            if sem is None:
+                sem = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    @contextmanager
+    def slot(self, url):
+        # 固定先取主機再取全域，避免交叉等待
+        host_sem = self._host_semaphore(url)
+        with host_sem:
+            with self._global:
+                yield
+
+
+class BatchPipeline:
+    """
+    分階段並行處理型號清單
+    產生的 ZIP 結構 ({model_number}/{filename}) 與報表內容與原本的逐筆迴圈相同
+    """
+
+    def __init__(self, domain, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST, client=None,
+                 max_image_bytes=None, cache=None, store=None, candidate_filter=None, manifest=None,
+                 incremental=False, product_index=None, rate=None, metrics=None):
+        self.domain = domain
+        self.max_image_bytes = max_image_bytes or None
+        self.concurrency = max(1, int(concurrency))
+        self.limiter = ConcurrencyLimiter(self.concurrency, per_host)
+        # 每個主機的自適應速率 (取代固定延遲)
+        self.rate = rate or AdaptiveRateController()
+        # 連線池大小對齊並發數，避免執行緒等待連線或連線被丟棄
+        self.client = client or HttpClient(pool_maxsize=self.concurrency, rate=self.rate)
+        # 搜尋頁 / 商品頁快取 (PageCache)，None 表示不使用
+        self.cache = cache
+        # 內容定址圖片庫 (ImageStore)，None 表示每次都重新下載
+        self.store = store
+        # 候選圖片篩選規則 (CandidateFilter)，None 表示保留所有圖片
+        self.candidate_filter = candidate_filter
+        # 執行紀錄 (RunManifest)，需搭配圖片庫才能略過已完成的型號；
+        # incremental 為 True 時已完成的型號仍會重新檢查商品頁
+        self.manifest = manifest if store is not None else None
+        self.incremental = incremental
+        # 影響結果的設定指紋，與紀錄不同時已完成的型號需重新處理
+        self.settings = settings_fingerprint(
+            domain=domain, max_image_bytes=self.max_image_bytes,
+            include=[p.pattern for p in candidate_filter.include] if candidate_filter else None,
+            exclude=[p.pattern for p in candidate_filter.exclude] if candidate_filter else None)
+        # 型號 → 商品頁網址索引 (ProductIndex)，None 表示每個型號都搜尋
+        self.product_index = product_index
+        # 各階段計量 (次數 / 位元組 / 錯誤 / 延遲分布)
+        self.metrics = metrics or StageMetrics()
+
+    @property
+    def stats(self):
+        return self.client.stats
+
+    def _get(self, url, stage, **kwargs):
+        # 名額只在請求進行中佔用，等待速率權杖與重試退避時釋放，受限的主機不會佔住其他主機的名額
+        return self.client.get(url, stage=stage, slot=self.limiter.slot, **kwargs)
+
+    @contextmanager
+    def _stream(self, url, stage, **kwargs):
+        """串流 GET：名額保留到內容讀取完畢、回應關閉為止，並發上限涵蓋整個傳輸"""
+        with self._get(url, stage, stream=True, **kwargs) as response:
+            yield response
+
+    def _fetch_page(self, url, stage, params=None, headers=None, revalidate=False):
+        """
+        取得搜尋頁 / 商品頁，優先使用快取
+        有效期內直接回傳 (不發出請求)；過期或 revalidate 為 True 時帶 ETag / Last-Modified 重新驗證
+        """
+        if self.cache is None:
+            return self._get(url, stage, params=params, headers=headers)
+
+        key = self.cache.make_key(url, params)
+        cached, fresh = self.cache.lookup(key)
+        if fresh and not revalidate:
+            self.cache.stats.add(stage, 'hits')
+            return cached
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            request_headers.update(self.cache.conditional_headers(cached))
+        response = self._get(url, stage, params=params, headers=request_headers)
+
+        if cached is not None and response.status_code == 304:
+            self.cache.refresh(key)
+            self.cache.stats.add(stage, 'revalidated')
+            return cached
+
+        self.cache.stats.add(stage, 'misses')
+        if response.status_code == 200:
+            self.cache.store(key, response)
+        return response
+
+    # --- 階段 0: 商品索引 ---
+    def prefetch_index(self, seeds, list_pattern=DEFAULT_LIST_PATTERN, max_pages=DEFAULT_MAX_PAGES):
+        """
+        抓取商品列表頁並更新商品索引，回傳 (收錄型號數, 成功抓取頁數)
+        沒有抓到任何列表頁或型號時 (種子頁失敗、版面不符) 不更新抓取時間，索引維持過期
+        """
+        seeds = [urljoin(self.domain, seed) for seed in seeds]
+        index, pages = crawl(lambda url: self._fetch_page(url, 'index'), seeds, list_pattern, max_pages,
+                             workers=self.concurrency)
+        if pages and index:
+            self.product_index.update(index)
+        return len(index), pages
+
+    # --- 階段 1: 搜尋 ---
+    def search(self, job, result, use_index=True):
+        """回傳 (product_links, search_url)"""
+        product_links = []
+        search_url = None
+
+        # 1. 嘗試從 Excel 獲取 URL
+        if job.product_url:
+            product_url = job.product_url
+            if not product_url.startswith(('http://', 'https://')):
+                product_url = urljoin(self.domain, product_url)
+            product_links.append(product_url)
+            search_url = self.domain
+
+        # 2. 查詢商品索引
+        if not product_links and use_index and self.product_index is not None:
+            product_links = self.product_index.lookup(job.model_number)
+            if product_links:
+                search_url = self.domain
+                result.indexed = True
+
+        # 3. 如果沒有 URL，執行搜尋 (原始邏輯)
+        if not product_links:
+            search_url = f"{self.domain}/goods/list_search.php"
+            params = {'top_sk': job.model_number}
+            try:
+                with self.metrics.timer('search', job.model_number) as span:
+                    resp = self._fetch_page(search_url, 'search', params=params)
+                    span.bytes = len(resp.content)
+                    span.error = resp.status_code in RETRY_STATUS
+                    if span.error:
+                        # 重試後仍失敗：不可視為查無商品，下次執行需重新搜尋
+                        result.complete = False
+                        result.logs.append(f"❌ {job.model_number} 搜尋失敗: HTTP {resp.status_code}")
+                        return product_links, search_url
+
+                    # 解析頁面 (原始邏輯：同時檢查 detail.php 和 disp.php)
+                    soup = BeautifulSoup(resp.content, 'html.parser')
+                    for link in soup.find_all('a', href=True):
+                        href = link.get('href', '')
+                        if 'goods/detail.php' in href or 'goods/disp.php' in href:
+                            product_links.append(urljoin(search_url, href))
+
+                    # 如果沒找到連結但頁面本身就是商品頁 (跳轉)
+                    if not product_links and ('goods/detail.php' in resp.url or 'goods/disp.php' in resp.url):
+                        product_links.append(resp.url)
+
+                if product_links and self.product_index is not None:
+                    self.product_index.learn(job.model_number, product_links[:3])
+            except Exception as e:
+                result.complete = False
+                result.logs.append(f"❌ {job.model_number} 搜尋失敗: {e}")
+
+        return product_links, search_url
+
+    # --- 階段 2: 商品頁 ---
+    def fetch_product_images(self, job, result, product_links, search_url, revalidate=False):
+        """
+        回傳 (relevant_images, referer)；referer 為最後處理的商品頁 (與原始邏輯相同)
+        revalidate 為 True 時不使用有效期內的快取，一律向伺服器確認 (未變更時為 304)
+        """
+        relevant_images = []
+        referer = None
+        # 原始腳本這裡只取前 3 個連結
+        for product_url in product_links[:3]:
+            referer = product_url
+            try:
+                with self.metrics.timer('product', job.model_number) as span:
+                    product_response = self._fetch_page(product_url, 'product', headers={'Referer': search_url},
+                                                        revalidate=revalidate)
+                    span.bytes = len(product_response.content)
+                    span.error = product_response.status_code != 200
+
+                if product_response.status_code != 200:
+                    if product_response.status_code in RETRY_STATUS:
+                        result.complete = False
+                    continue
+
+                # 商品頁只解析一次，HTML 與 JS 提取共用
+                with self.metrics.timer('html_parse', job.model_number):
+                    product_tree = parse_html(product_response.content)
+                    html_images = extract_images_from_html(product_tree, product_url)
+                if html_images: relevant_images.extend(html_images)
+
+                with self.metrics.timer('js_parse', job.model_number):
+                    js_images = extract_images_from_js(product_tree, product_url)
+                if js_images: relevant_images.extend(js_images)
+
+            except Exception as e:
+                result.complete = False
+                result.logs.append(f"❌ {job.model_number} 商品頁失敗: {e}")
+
+        # 去除重複URL (保留首次出現順序)
+        return list(dict.fromkeys(relevant_images)), referer
+
+    # --- 階段 3: 圖片下載 ---
+    def _stream_image(self, img_url, referer, sink):
+        """
+        單次串流 GET 將圖片寫入 sink，回傳 (status_code, (content_type, sha256))；
+        失敗或非圖片時第二項為 None；請求本身失敗或讀取內容中斷 (連線重設、逾時、內容不完整)
+        時 status_code 為 None，視為暫時性失敗
+        狀態碼與 Content-Type 由回應標頭判斷，非圖片時不讀取內容即中止；
+        超過 max_image_bytes 時放棄
+        """
+        # User-Agent 等原始 Headers 由 Session 提供
+        headers = {'Referer': referer or self.domain, 'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'}
+        try:
+            with self._stream(img_url, 'image', headers=headers) as img_response:
+                return self._read_image(img_response, sink)
+        except Exception:
+            return None, None  # 如果請求失敗就跳過
+
+    def _read_image(self, img_response, sink):
+        status = img_response.status_code
+        content_type = img_response.headers.get('Content-Type', '')
+        if status != 200 or 'image/' not in content_type:
+            return status, None
+
+        content_length = img_response.headers.get('Content-Length', '')
+        if self.max_image_bytes and content_length.isdigit() and int(content_length) > self.max_image_bytes:
+            return status, None
+
+        digest = hashlib.sha256()
+        try:
+            size = 0
+            for chunk in img_response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if self.max_image_bytes and size > self.max_image_bytes:
+                    return status, None
+                digest.update(chunk)
+                sink.write(chunk)
+        except Exception:
+            self.stats.add('image', 'failures')
+            return None, None
+        return status, (content_type, digest.hexdigest())
+
+    def _fetch_variant(self, img_url, referer, model_number, img_idx):
+        """
+        下載單一 URL，回傳 (ImageItem 或 None, status_code)
+        有圖片庫時先查詢 URL，已下載過的直接由本機取用
+        """
+        if self.store is None:
+            body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            status, fetched = self._stream_image(img_url, referer, body)
+            if fetched is None:
+                body.close()
+                return None, status
+            size = body.tell()
+            body.seek(0)
+            content_type, sha256 = fetched
+            filename = image_filename(img_url, content_type, model_number, img_idx)
+            return ImageItem(img_idx, filename, body, sha256, url=img_url, size=size), status
+
+        status = 200
+        with self.store.claim(img_url):
+            stored = self.store.lookup(img_url)
+            reused = stored is not None
+            if not reused:
+                tmp_file = self.store.new_file()
+                status, fetched = self._stream_image(img_url, referer, tmp_file)
+                if fetched is None:
+                    self.store.discard(tmp_file)
+                    return None, status
+                content_type, sha256 = fetched
+                stored = self.store.commit(img_url, tmp_file, sha256, content_type)
+
+        filename = image_filename(img_url, stored.content_type, model_number, img_idx)
+        return ImageItem(img_idx, filename, None, stored.sha256, reused, url=img_url, size=stored.size,
+                         path=self.store.object_path(stored.sha256)), status
+
+    def download_image(self, candidate, referer, model_number, img_idx, known=None):
+        """
+        下載一張邏輯圖片，回傳 (ImageItem 或 None, 狀態)
+        由最高解析度開始嘗試，只有 404 時才改試下一個較低解析度；
+        known 為執行紀錄中的同一張圖，已完成或確定不存在時不再發出請求
+        """
+        with self.metrics.timer('image', model_number) as span:
+            item, status = self._download_image(candidate, referer, model_number, img_idx, known)
+            # 位元組只計實際下載的部分 (不含由圖片庫取用)
+            if item is not None and not item.reused:
+                span.bytes = item.size or 0
+            span.error = status == IMAGE_FAILED
+        return item, status
+
+    def _download_image(self, candidate, referer, model_number, img_idx, known):
+        if known is not None:
+            if known.status == IMAGE_DONE and self.store.has(known.sha256):
+                return ImageItem(img_idx, known.filename, None, known.sha256, True, known.url, known.size,
+                                 self.store.object_path(known.sha256)), IMAGE_DONE
+            if known.status == IMAGE_MISSING:
+                return None, IMAGE_MISSING
+
+        for img_url in candidate.urls:
+            item, status = self._fetch_variant(img_url, referer, model_number, img_idx)
+            if item is not None:
+                return item, IMAGE_DONE
+            if status != 404:
+                break
+        if status is None or status in RETRY_STATUS:
+            return None, IMAGE_FAILED
+        return None, IMAGE_MISSING
+
+    def _restore(self, result, known_images):
+        """由執行紀錄與圖片庫還原已完成的型號；圖片庫缺檔時回傳 False"""
+        done = sorted((r for r in known_images.values() if r.status == IMAGE_DONE), key=lambda r: r.img_idx)
+        if not all(self.store.has(r.sha256) for r in done):
+            return False
+        result.images = [
+            ImageItem(r.img_idx, r.filename, None, r.sha256, True, r.url, r.size, self.store.object_path(r.sha256))
+            for r in done
+        ]
+        result.restored = True
+        return True
+
+    def process_model(self, job, image_pool):
+        result = ModelResult(job.index, job.model_number)
+        record = self.manifest.get_model(job.model_number) if self.manifest else None
+        known_images = self.manifest.get_images(job.model_number) if record else {}
+        same_settings = record is not None and record.settings == self.settings
+        # 以不同設定 (網域、圖片篩選、大小上限) 完成的型號需重新處理
+        finished = same_settings and record.complete
+
+        # 接續模式：已完成的型號完全不發出請求
+        if finished and not self.incremental and self._restore(result, known_images):
+            return result
+
+        # 增量模式：沿用記錄的商品頁網址 (免搜尋)，圖片清單未變更時直接沿用；
+        # 商品頁一律重新驗證，頁面快取有效期內的變更也能發現
+        if finished and record.product_urls:
+            product_links, search_url = record.product_urls, record.search_url
+        else:
+            product_links, search_url = self.search(job, result)
+        relevant_images, referer = self.fetch_product_images(job, result, product_links, search_url,
+                                                             revalidate=finished and self.incremental)
+        if result.indexed and result.complete and not relevant_images:
+            # 索引中的網址已失效 (商品下架或改版)：移除後改用搜尋
+            self.product_index.discard(job.model_number)
+            result.indexed = False
+            product_links, search_url = self.search(job, result, use_index=False)
+            relevant_images, referer = self.fetch_product_images(job, result, product_links, search_url)
+        signature = image_signature(relevant_images)
+        # 圖片清單未變更，或重新檢查時發生暫時性錯誤：沿用上次的結果
+        if finished and (signature == record.signature or not result.complete) and self._restore(result, known_images):
+            return result
+        if record is not None and (signature != record.signature or not same_settings):
+            # 商品頁或設定已變更：先前確定不存在 (或超過大小上限) 的圖片需重試，只沿用已下載的部分
+            known_images = {key: r for key, r in known_images.items() if r.status == IMAGE_DONE}
+
+        # 網路請求前先篩掉非商品圖片，並將同一張圖的各解析度合併
+        with self.metrics.timer('candidates', job.model_number):
+            candidates = select_candidates(relevant_images, self.candidate_filter)
+
+        futures = [
+            image_pool.submit(self.download_image, candidate, referer, job.model_number, img_idx,
+                              known_images.get(candidate.urls[0]))
+            for img_idx, candidate in enumerate(candidates)
+        ]
+        outcomes = [f.result() for f in futures]
+        result.images = [item for item, _ in outcomes if item]
+        result.complete = result.complete and all(status != IMAGE_FAILED for _, status in outcomes)
+
+        if self.manifest:
+            self.manifest.record_model(job.model_number, product_links, search_url, signature, result.complete, [
+                ImageRecord(img_idx, candidate.urls, item and item.url, item and item.filename, status,
+                            item and item.size, item and item.sha256)
+                for img_idx, (candidate, (item, status)) in enumerate(zip(candidates, outcomes))
+            ], settings=self.settings)
+        return result
+
+    def run(self, jobs):
+        """
+        並行處理所有型號，依完成順序逐一產出 ModelResult
+        產出動作在呼叫端的執行緒進行，可直接更新 Streamlit 元件
+        呼叫端提前停止 (關閉產生器、Streamlit 重新執行、處理結果時發生例外) 時取消尚未開始的工作，
+        只等待進行中的請求結束，未產出的結果釋放暫存檔
+        """
+        model_pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        image_pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = [model_pool.submit(self.process_model, job, image_pool) for job in jobs]
+        pending = set(futures)
+        try:
+            for future in as_completed(futures):
+                pending.discard(future)
+                yield future.result()
+        finally:
+            model_pool.shutdown(wait=False, cancel_futures=True)
+            image_pool.shutdown(wait=True, cancel_futures=True)
+            model_pool.shutdown(wait=True)
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    future.result().close()
+
+
+def image_filename(img_url, content_type, model_number, img_idx):
+    """由 URL 取得檔名，沒有檔名時以型號 + 序號 + Content-Type 組出 (原始邏輯)"""
+    parsed_url = urlparse(img_url)
+    original_filename = os.path.basename(parsed_url.path)
+
+    # 檔名處理
+    if not original_filename:
+        ext = '.' + content_type.split('/')[-1]
+        original_filename = f"{model_number}_{img_idx+1}{ext}"
+
+    return original_filename.split('?')[0]
+
+
+def write_model_to_zip(archive, result):
+    """
+    將單一型號的圖片寫入 ArchiveWriter，回傳報表列
+    重名處理與顏色統計與原始邏輯相同；同一型號資料夾內內容完全相同的圖片只寫入一次
+    """
+    model_number = result.model_number
+    item_img_count = 0
+    duplicate_count = 0
+    item_colors = set()
+
+    for item in result.images:
+        with item.open() as body:
+            # 同一資料夾已有相同內容時不再寫入，但仍計入圖片數量
+            if archive.find_duplicate(model_number, item.sha256):
+                duplicate_count += 1
+            else:
+                # 為了避免重名覆蓋，這裡做簡單的 unique 處理
+                zip_path = f"{model_number}/{item.filename}"
+                if zip_path in archive:
+                    name, ext = os.path.splitext(item.filename)
+                    zip_path = f"{model_number}/{name}_{item.img_idx}{ext}"
+
+                archive.add_file(zip_path, body, folder=model_number, sha256=item.sha256)
+        item_img_count += 1
+
+        # 收集顏色 (報表用)
+        c = extract_color_code(item.filename)
+        if c: item_colors.add(c)
+
+    colors_str = ",".join(sorted(list(item_colors))) if item_colors else "無/未識別"
+    return {
+        "商品型號": model_number,
+        "圖片數量": item_img_count,
+        "已取得顏色": colors_str,
+        "狀態": "成功" if item_img_count > 0 else "失敗/無圖片",
+        "已存在略過下載": sum(1 for item in result.images if item.reused),
+        "重複內容略過": duplicate_count,
+    }
@@ -0,0 +1,198 @@
+"""
+型號 → 商品頁網址索引
+原本每個沒有網址欄的型號都要搜尋一次 (list_search.php)，型號多時是最大的單項成本。
+此索引預先以少量請求抓取商品列表頁 (含分頁)，一次建立整批型號的對照並保存於 SQLite；
+批次中先查索引，未命中才退回逐筆搜尋，搜尋結果也會補入索引。
+更新策略：
+1. 上次完整抓取超過有效時間 (TTL) 即視為過期，下一批次需要時重新抓取
+2. 索引中的網址若已失效 (商品頁沒有任何圖片)，移除該筆並改用搜尋
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse, parse_qs
+
+from extractors import parse_html
+from http_client import HttpStats
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'montbell_downloader', 'products.sqlite3')
+DEFAULT_INDEX_TTL = 24 * 60 * 60  # 秒
+DEFAULT_MAX_PAGES = 200
+# 需要查詢的型號未達此數量時不抓取列表頁 (逐筆搜尋較便宜)
+DEFAULT_MIN_MISSES = 100
+
+# 由網站首頁沿著商品列表 (含分頁連結) 走訪
+DEFAULT_SEEDS = ('/',)
+DEFAULT_LIST_PATTERN = r'/goods/list\.php'
+PRODUCT_LINK = re.compile(r'goods/(?:detail|disp)\.php')
+MODEL_PARAMS = ('product_id',)
+
+
+class IndexStats(HttpStats):
+    """統計索引命中 / 未命中 / 搜尋補入 / 失效次數"""
+
+    FIELDS = ('hits', 'misses', 'learned', 'stale')
+
+    def hit_rate(self):
+        c = self.snapshot().get('search')
+        if not c or not (c['hits'] + c['misses']):
+            return None
+        return c['hits'] / (c['hits'] + c['misses'])
+
+    def rows(self):
+        return [
+            {"階段": stage, "命中": c['hits'], "未命中": c['misses'],
+             "命中率": f"{c['hits'] / (c['hits'] + c['misses']):.1%}" if c['hits'] + c['misses'] else "-",
+             "搜尋補入": c['learned'], "失效移除": c['stale']}
+            for stage, c in sorted(self.snapshot().items())
+        ]
+
+
+def model_number_from_url(url):
+    """由商品頁網址的查詢參數取得型號 (product_id)，無法辨識時回傳 None"""
+    query = parse_qs(urlparse(url).query)
+    for name in MODEL_PARAMS:
+        if query.get(name):
+            return query[name][0].strip() or None
+    return None
+
+
+def extract_list_links(content, base_url, list_pattern):
+    """回傳 (商品頁網址, 列表頁網址)，皆保持出現順序且不重複"""
+    tree = parse_html(content)
+    products, lists = {}, {}
+    for href in tree.xpath('//a/@href'):
+        if PRODUCT_LINK.search(href):
+            products[urljoin(base_url, href)] = None
+        elif list_pattern.search(href) and 'list_search' not in href:
+            url = urljoin(base_url, href).split('#')[0]
+            if urlparse(url).netloc == urlparse(base_url).netloc:
+                lists[url] = None
+    return list(products), list(lists)
+
+
+def crawl(fetch, seeds, list_pattern=DEFAULT_LIST_PATTERN, max_pages=DEFAULT_MAX_PAGES, workers=4):
+    """
+    由 seeds 開始逐層抓取列表頁，沿頁面上的列表 / 分頁連結前進，最多 max_pages 頁
+    fetch(url) 回傳具 status_code / content / url 的回應；單頁失敗只略過該頁
+    回傳 ({型號: [商品頁網址]}, 成功抓取的頁數)
+    """
+    pattern = re.compile(list_pattern)
+    index = {}
+    seen = set(seeds)
+    frontier = list(seeds)
+    attempted = pages = 0
+
+    def visit(url):
+        try:
+            response = fetch(url)
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+        return extract_list_links(response.content, response.url or url, pattern)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while frontier and attempted < max_pages:
+            wave = frontier[:max_pages - attempted]
+            attempted += len(wave)
+            frontier = []
+            for links in pool.map(visit, wave):
+                if links is None:
+                    continue
+                pages += 1
+                products, lists = links
+                for product_url in products:
+                    model_number = model_number_from_url(product_url)
+                    if model_number:
+                        urls = index.setdefault(model_number, [])
+                        if product_url not in urls:
+                            urls.append(product_url)
+                for url in lists:
+                    if url not in seen:
+                        seen.add(url)
+                        frontier.append(url)
+    return index, pages
+
+
+class ProductIndex:
+    """型號 → 商品頁網址清單的磁碟索引 (執行緒安全)"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, ttl=DEFAULT_INDEX_TTL):
+        self.ttl = ttl
+        self.stats = IndexStats()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS products (
+                model_number TEXT PRIMARY KEY,
+                product_urls TEXT NOT NULL,
+                source TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            );
+        ''')
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+
+    def __contains__(self, model_number):
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM products WHERE model_number = ?', (model_number,)).fetchone()
+        return row is not None
+
+    def crawled_at(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'crawled_at'").fetchone()
+        return row[0] if row else None
+
+    def is_stale(self):
+        crawled_at = self.crawled_at()
+        return crawled_at is None or time.time() - crawled_at >= self.ttl
+
+    def lookup(self, model_number):
+        """回傳商品頁網址清單，未收錄時回傳空清單；同時計入命中率"""
+        with self._lock:
+            row = self._conn.execute('SELECT product_urls FROM products WHERE model_number = ?',
+                                     (model_number,)).fetchone()
+        self.stats.add('search', 'hits' if row else 'misses')
+        return json.loads(row[0]) if row else []
+
+    def update(self, index):
+        """寫入一次列表頁抓取的結果 ({型號: [網址]}) 並記錄抓取時間 (呼叫端需確認抓取成功)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)',
+                [(model_number, json.dumps(urls), 'crawl', now) for model_number, urls in index.items()])
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('crawled_at', ?)", (now,))
+
+    def learn(self, model_number, product_urls):
+        """補入逐筆搜尋找到的商品頁"""
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)',
+                               (model_number, json.dumps(product_urls), 'search', time.time()))
+        self.stats.add('search', 'learned')
+
+    def discard(self, model_number):
+        """移除已失效的網址"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM products WHERE model_number = ?', (model_number,))
+        self.stats.add('search', 'stale')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,172 @@
+"""
+每個主機的自適應請求速率 (取代固定的 time.sleep(delay))
+以權杖桶 (token bucket) 控制每個主機的請求間隔，速率依 AIMD 調整：
+回應成功且延遲正常時逐步加速 (加法增加)，遇到 429 / 502 / 503 / 504、連線逾時或延遲明顯上升時
+大幅減速 (乘法減少)，其他 5xx 維持目前速率；伺服器回傳 Retry-After 時該主機暫停到指定時間。
+速率不超過設定的上限，也不低於下限。
+"""
+import email.utils
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+DEFAULT_START_RATE = 2.0  # 次/秒
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_INCREASE = 1.0  # 全速時每秒增加的速率 (每次成功最多增加此值)
+DEFAULT_DECREASE = 0.5  # 減速時乘上的比例
+DEFAULT_LATENCY_FACTOR = 2.0  # 近期延遲超過基準的倍數即減速
+LATENCY_MIN_DELTA = 0.25  # 且至少高出此秒數 (忽略極短延遲的抖動)
+DEFAULT_COOLDOWN = 1.0  # 兩次減速的最短間隔 (秒)，避免同一波失敗連續減速
+RETRY_AFTER_MAX = 120
+
+PRESSURE_STATUS = {429, 502, 503, 504}  # 過載或閘道逾時：減速
+LATENCY_MIN_SAMPLES = 10
+MAX_EVENTS = 1000
+
+
+def parse_retry_after(value):
+    """Retry-After 可為秒數或 HTTP 日期，回傳秒數 (上限 RETRY_AFTER_MAX)；無法解析時回傳 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = int(value)
+    else:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), RETRY_AFTER_MAX)
+
+
+class _HostState:
+    """單一主機的權杖桶與延遲統計 (由 AdaptiveRateController 的鎖保護)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.peak = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.recent_latency = None  # 近期延遲 (快速移動平均)
+        self.base_latency = None  # 基準延遲 (慢速移動平均)
+        self.samples = 0
+        self.decreases = 0
+        self.retry_afters = 0
+
+    def refill(self, now):
+        # 權杖上限為 1：不允許累積後瞬間爆量；updated 可能因暫停而在未來
+        if now > self.updated:
+            self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+
+class AdaptiveRateController:
+    """每個主機獨立的權杖桶 + AIMD 速率控制 (執行緒安全)"""
+
+    def __init__(self, start_rate=DEFAULT_START_RATE, max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE,
+                 increase=DEFAULT_INCREASE, decrease=DEFAULT_DECREASE, latency_factor=DEFAULT_LATENCY_FACTOR,
+                 cooldown=DEFAULT_COOLDOWN):
+        self.max_rate = max(float(max_rate), 0.01)
+        self.min_rate = min(max(float(min_rate), 0.01), self.max_rate)
+        self.start_rate = min(max(float(start_rate), self.min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, url):
+        # 呼叫端需持有 self._lock
+        host = urlparse(url).netloc
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.start_rate)
+        return host, state
+
+    def acquire(self, url):
+        """預約一個權杖，必要時等待 (等待中的請求依預約順序放行)"""
+        with self._lock:
+            _, state = self._host(url)
+            now = time.monotonic()
+            state.refill(now)
+            if state.blocked_until > state.updated:
+                # 暫停期間不累積權杖：排程移到暫停結束，等待中的請求之後仍依速率間隔放行
+                state.updated = state.blocked_until
+            state.tokens -= 1
+            wait = state.updated - now + max(0.0, -state.tokens / state.rate)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, url, status=None, latency=None, retry_after=None):
+        """回報一次請求的結果；status 為 None 表示連線錯誤或逾時"""
+        with self._lock:
+            host, state = self._host(url)
+            now = time.monotonic()
+
+            seconds = parse_retry_after(retry_after)
+            if seconds:
+                state.blocked_until = max(state.blocked_until, now + seconds)
+                state.retry_afters += 1
+                self._event(host, 'Retry-After', f"暫停 {seconds:.0f} 秒")
+
+            if status is None or status in PRESSURE_STATUS:
+                self._decrease(host, state, now, str(status) if status else '連線錯誤')
+                return
+            if status >= 500:
+                return  # 其他伺服器錯誤不代表過載，但也不加速
+
+            if latency is not None:
+                state.samples += 1
+                if state.recent_latency is None:
+                    state.recent_latency = state.base_latency = latency
+                else:
+                    state.recent_latency += 0.3 * (latency - state.recent_latency)
+                    state.base_latency += 0.02 * (latency - state.base_latency)
+                if (state.samples >= LATENCY_MIN_SAMPLES
+                        and state.recent_latency > state.base_latency * self.latency_factor
+                        and state.recent_latency - state.base_latency > LATENCY_MIN_DELTA):
+                    self._decrease(host, state, now, f"延遲上升 {state.base_latency:.2f}s → {state.recent_latency:.2f}s")
+                    # 以新的延遲為基準，持續上升才會再次減速 (避免延遲永久改變時一直停在下限)
+                    state.base_latency = state.recent_latency
+                    return
+
+            # 加法增加：全速時每秒約增加 increase
+            state.rate = min(self.max_rate, state.rate + min(self.increase, self.increase / state.rate))
+            state.peak = max(state.peak, state.rate)
+
+    def _decrease(self, host, state, now, reason):
+        # 呼叫端需持有 self._lock
+        if now - state.last_decrease < self.cooldown:
+            return
+        state.rate = max(self.min_rate, state.rate * self.decrease)
+        state.last_decrease = now
+        state.decreases += 1
+        self._event(host, reason, f"降為 {state.rate:.2f} 次/秒")
+
+    def _event(self, host, reason, action):
+        self.events.append({"時間": time.strftime('%H:%M:%S'), "主機": host, "原因": reason, "處置": action})
+
+    def current_rates(self):
+        """回傳 {主機: 目前速率}"""
+        with self._lock:
+            return {host: state.rate for host, state in self._hosts.items()}
+
+    def rows(self):
+        """轉為報表列 (每個主機一列)"""
+        with self._lock:
+            return [
+                {"主機": host, "目前速率 (次/秒)": round(s.rate, 2), "最高速率 (次/秒)": round(s.peak, 2),
+                 "速率上限 (次/秒)": self.max_rate, "減速次數": s.decreases, "Retry-After 次數": s.retry_afters,
+                 "基準延遲 (秒)": round(s.base_latency, 3) if s.base_latency is not None else None}
+                for host, s in sorted(self._hosts.items())
+            ]
+
+    def event_rows(self):
+        with self._lock:
+            return list(self.events)
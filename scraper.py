@@ -0,0 +1,175 @@
+"""
+Montbell 商品圖片抓取核心邏輯
+嚴格複製自原始 Python 腳本，供 Streamlit 介面與批次引擎共用
+"""
+import os
+import re
+from urllib.parse import urljoin
+
+# ==============================================================================
+# 核心邏輯區 - 嚴格複製自原始 Python 腳本
+# ==============================================================================
+
+def get_original_headers(referer=None):
+    """完全還原原始腳本的 Headers (使用電腦版 User-Agent)"""
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+        'Referer': referer if referer else 'https://webshop.montbell.jp/',
+        'Connection': 'keep-alive',
+    }
+
+def original_extract_images_from_html(soup, base_url):
+    """
+    [原始邏輯] 從HTML頁面提取圖片URL
+    複製自: extract_images_from_html 方法
+    """
+    image_urls = []
+    
+    # 1. 從fancy_largelink元素提取圖片
+    fancy_links = soup.select('a.fancy_largelink')
+    if fancy_links:
+        for link in fancy_links:
+            # 高解析度圖片 (href)
+            hd_img_url = link.get('href')
+            if hd_img_url:
+                if not hd_img_url.startswith(('http://', 'https://')):
+                    hd_img_url = urljoin(base_url, hd_img_url)
+                image_urls.append(hd_img_url)
+            
+            # 頁面顯示圖片 (img src)
+            img_tag = link.select_one('img')
+            if img_tag and img_tag.get('src'):
+                img_url = img_tag.get('src')
+                if not img_url.startswith(('http://', 'https://')):
+                    img_url = urljoin(base_url, img_url)
+                if img_url not in image_urls:
+                    image_urls.append(img_url)
+    
+    # 2. 從隱藏區域獲取圖片
+    hidden_imgs = soup.select('#img_hidden_pre img, #img_hidden_later img')
+    for img in hidden_imgs:
+        img_url = img.get('src')
+        if img_url:
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urljoin(base_url, img_url)
+            if img_url not in image_urls:
+                image_urls.append(img_url)
+    
+    # 3. 獲取主圖
+    main_img = soup.select_one('#largelinkImg')
+    if main_img and main_img.get('src'):
+        img_url = main_img.get('src')
+        if not img_url.startswith(('http://', 'https://')):
+            img_url = urljoin(base_url, img_url)
+        if img_url not in image_urls:
+            image_urls.append(img_url)
+    
+    # 4. 從縮略圖區域獲取圖片
+    thumb_imgs = soup.select('.cutImglArea img')
+    for img in thumb_imgs:
+        img_url = img.get('src')
+        if img_url:
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urljoin(base_url, img_url)
+            
+            if img_url not in image_urls:
+                image_urls.append(img_url)
+            
+            # 嘗試獲取高解析度版本
+            if '/cut_c/' in img_url:
+                hd_img_url = img_url.replace('/cut_c/', '/cut_k/').replace('cc_', 'ck_')
+                if hd_img_url not in image_urls:
+                    image_urls.append(hd_img_url)
+            elif '/prod_c/' in img_url:
+                hd_img_url = img_url.replace('/prod_c/', '/prod_k/').replace('c_', 'k_')
+                if hd_img_url not in image_urls:
+                    image_urls.append(hd_img_url)
+    
+    # 5. 從所有img標籤提取圖片 (這是原版邏輯的最後一步)
+    all_images = soup.select('img[src]')
+    for img in all_images:
+        img_url = img.get('src')
+        if img_url and any(ext in img_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif']):
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urljoin(base_url, img_url)
+            if img_url not in image_urls:
+                image_urls.append(img_url)
+                
+    return image_urls
+
+def original_extract_images_from_js(soup, base_url):
+    """
+    [原始邏輯] 從JavaScript提取圖片URL
+    複製自: extract_images_from_js 方法
+    """
+    image_urls = []
+    scripts = soup.find_all('script')
+    
+    image_data = {}
+    image_paths = {}
+    
+    for script in scripts:
+        script_text = script.string
+        if script_text and ('cimages' in script_text or 'kimages' in script_text):
+            # 提取圖片文件名和路徑
+            for line in script_text.split('\n'):
+                # 圖片文件名
+                cimages_match = re.search(r"cimages\['([^']+)'\]\s*=\s*'([^']+)'", line)
+                if cimages_match:
+                    key, value = cimages_match.groups()
+                    if key not in image_data:
+                        image_data[key] = {}
+                    image_data[key]['cimage'] = value
+                
+                kimages_match = re.search(r"kimages\['([^']+)'\]\s*=\s*'([^']+)'", line)
+                if kimages_match:
+                    key, value = kimages_match.groups()
+                    if key not in image_data:
+                        image_data[key] = {}
+                    image_data[key]['kimage'] = value
+                
+                # 圖片路徑
+                cimage_path_match = re.search(r"cimage_paths\['([^']+)'\]\s*=\s*'([^']+)'", line)
+                if cimage_path_match:
+                    key, value = cimage_path_match.groups()
+                    image_paths[f'cimage_paths_{key}'] = value
+                
+                kimage_path_match = re.search(r"kimage_paths\['([^']+)'\]\s*=\s*'([^']+)'", line)
+                if kimage_path_match:
+                    key, value = kimage_path_match.groups()
+                    image_paths[f'kimage_paths_{key}'] = value
+    
+    # 構建完整URL
+    if image_data:
+        for key, data in image_data.items():
+            # 高解析度圖片 (cimage)
+            if 'cimage' in data:
+                cimage_path = image_paths.get(f'cimage_paths_{key}', '/common/images/product/prod_c')
+                cimage_url = f"{base_url}{cimage_path}/{data['cimage']}"
+                # 修正：原始腳本這裡可能沒有做 urljoin，但為了保險起見我們做一下處理，如果原腳本依賴字串拼接則保持
+                # 為了避免雙重 slash，這裡簡單處理
+                cimage_url = cimage_url.replace('https://webshop.montbell.jp//', 'https://webshop.montbell.jp/') 
+                image_urls.append(cimage_url)
+            
+            # 低解析度圖片 (kimage)
+            if 'kimage' in data:
+                kimage_path = image_paths.get(f'kimage_paths_{key}', '/common/images/product/prod_k')
+                kimage_url = f"{base_url}{kimage_path}/{data['kimage']}"
+                kimage_url = kimage_url.replace('https://webshop.montbell.jp//', 'https://webshop.montbell.jp/')
+                image_urls.append(kimage_url)
+                
+    return image_urls
+
+def extract_color_code(filename):
+    """輔助功能：提取顏色代碼 (這是Web App新增的實用功能，保留)"""
+    try:
+        name_without_ext = os.path.splitext(filename)[0]
+        if '_' in name_without_ext:
+            parts = name_without_ext.split('_')
+            last_part = parts[-1]
+            if last_part.isdigit() and len(parts) > 1: return parts[-2]
+            return last_part
+    except: pass
+    return None
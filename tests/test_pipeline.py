@@ -0,0 +1,138 @@
+"""
+抓取管線的並發上限測試
+以回應內容傳送緩慢的本機伺服器確認每個主機的名額涵蓋整個傳輸 (不只到收到標頭為止)；
+呼叫端提前停止時不等整批跑完
+"""
+import http.server
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.server import ServerOptions, StandInServer
+from candidates import select_candidates
+from pipeline import BatchPipeline, ModelJob
+from rate_control import AdaptiveRateController
+
+FAST_RATE = 1000  # 本機伺服器不需限速
+CHUNKS = 4
+CHUNK_DELAY = 0.05
+
+
+class SlowImageHandler(http.server.BaseHTTPRequestHandler):
+    """送出標頭後分段緩慢傳送圖片內容，並記錄同時傳輸中的請求數"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        body = b'\xff\xd8\xff\xe0' + b'x' * 1020
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body) * CHUNKS))
+        self.end_headers()
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+        try:
+            for _ in range(CHUNKS):
+                self.wfile.write(body)
+                self.wfile.flush()
+                time.sleep(CHUNK_DELAY)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def slow_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowImageHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.in_flight = server.peak = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_per_host_limit_covers_body_transfer(slow_server):
+    base_url = f'http://127.0.0.1:{slow_server.server_address[1]}'
+    pipeline = BatchPipeline(base_url, concurrency=8, per_host=2, rate=AdaptiveRateController(FAST_RATE, FAST_RATE))
+    candidates = select_candidates([f'{base_url}/img/item_{i}.jpg' for i in range(8)], None)
+    assert len(candidates) == 8
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(
+                lambda c: pipeline.download_image(c[1], base_url, 'M', c[0]), enumerate(candidates)))
+    finally:
+        pipeline.client.close()
+
+    for item, _ in outcomes:
+        assert item is not None
+        item.open().close()
+    assert slow_server.peak == 2
+
+
+@pytest.fixture
+def stand_in():
+    server = StandInServer(('127.0.0.1', 0), ServerOptions(latency=0.02, image_size=1024))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def image_requests(server):
+    return server.snapshot().get('image', {}).get('requests', 0)
+
+
+def test_closing_run_cancels_remaining_models(stand_in):
+    pipeline = BatchPipeline(stand_in.base_url, concurrency=4, rate=AdaptiveRateController(FAST_RATE, FAST_RATE))
+    jobs = [ModelJob(i, str(1128001 + i)) for i in range(24)]
+    try:
+        results = pipeline.run(jobs)
+        first = next(results)
+        first.close()
+        started = time.perf_counter()
+        results.close()
+        elapsed = time.perf_counter() - started
+        sent = image_requests(stand_in)
+        time.sleep(0.3)
+        assert image_requests(stand_in) == sent  # 關閉後不再發出請求
+    finally:
+        pipeline.client.close()
+
+    assert elapsed < 2
+    # 每個型號約 150 張圖片，整批跑完會遠超過這個數量
+    assert sent < 24 * 50
+
+
+def test_throttled_host_does_not_hold_global_slot(stand_in):
+    other = StandInServer(('127.0.0.1', 0), ServerOptions())
+    threading.Thread(target=other.serve_forever, daemon=True).start()
+    rate = AdaptiveRateController(FAST_RATE, FAST_RATE)
+    pipeline = BatchPipeline(stand_in.base_url, concurrency=1, per_host=1, rate=rate)
+    throttled_url = f'{stand_in.base_url}/goods/disp.php?product_id=1128001'
+    rate.record(throttled_url, 429, retry_after='2')  # 該主機暫停 2 秒
+    try:
+        waiting = threading.Thread(target=pipeline._get, args=(throttled_url, 'product'))
+        waiting.start()
+        time.sleep(0.1)
+        started = time.perf_counter()
+        response = pipeline._get(f'{other.base_url}/goods/disp.php?product_id=1128002', 'product')
+        elapsed = time.perf_counter() - started
+        waiting.join()
+    finally:
+        pipeline.client.close()
+        other.shutdown()
+        other.server_close()
+
+    assert response.status_code == 200
+    # 唯一的全域名額不應被等待 Retry-After 的請求佔住
+    assert elapsed < 1
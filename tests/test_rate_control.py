@@ -0,0 +1,120 @@
+"""
+AdaptiveRateController 單元測試 (不需網路)
+"""
+import email.utils
+import threading
+import time
+
+import pytest
+
+from rate_control import AdaptiveRateController, parse_retry_after, RETRY_AFTER_MAX
+
+URL = 'https://example.com/goods/disp.php'
+OTHER_URL = 'https://other.example.com/a.jpg'
+
+
+def rate_of(controller, url=URL):
+    return controller.current_rates()[url.split('/')[2]]
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after(' 10 ') == 10
+    assert parse_retry_after(str(RETRY_AFTER_MAX * 10)) == RETRY_AFTER_MAX
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    date = email.utils.formatdate(time.time() + 5, usegmt=True)
+    assert 3 <= parse_retry_after(date) <= 5
+
+
+def test_success_increases_up_to_max():
+    controller = AdaptiveRateController(start_rate=2, max_rate=4, cooldown=0)
+    controller.record(URL, 200, 0.05)
+    assert rate_of(controller) > 2
+    for _ in range(100):
+        controller.record(URL, 200, 0.05)
+    assert rate_of(controller) == 4
+
+
+def test_throttling_halves_rate_with_cooldown():
+    controller = AdaptiveRateController(start_rate=8, max_rate=10, cooldown=60)
+    controller.record(URL, 429)
+    assert rate_of(controller) == 4
+    controller.record(URL, 503)  # 冷卻期間內不再減速
+    assert rate_of(controller) == 4
+    assert len(controller.event_rows()) == 1
+
+
+@pytest.mark.parametrize('status', [None, 429, 502, 503, 504])
+def test_pressure_decreases(status):
+    controller = AdaptiveRateController(start_rate=8, max_rate=10, cooldown=0)
+    controller.record(URL, status)
+    assert rate_of(controller) == 4
+
+
+@pytest.mark.parametrize('status', [500, 501, 505])
+def test_other_server_errors_do_not_increase(status):
+    controller = AdaptiveRateController(start_rate=2, max_rate=10, cooldown=0)
+    for _ in range(8):
+        controller.record(URL, status, 0.05)
+    assert rate_of(controller) == 2
+
+
+def test_rate_stays_above_min():
+    controller = AdaptiveRateController(start_rate=1, max_rate=10, min_rate=0.5, cooldown=0)
+    for _ in range(10):
+        controller.record(URL, 429)
+    assert rate_of(controller) == 0.5
+
+
+def test_latency_increase_decreases():
+    controller = AdaptiveRateController(start_rate=4, max_rate=4, cooldown=0)
+    for _ in range(20):
+        controller.record(URL, 200, 0.05)
+    assert rate_of(controller) == 4
+    for _ in range(5):
+        controller.record(URL, 200, 2.0)
+    assert rate_of(controller) < 4
+    assert any(e['原因'].startswith('延遲上升') for e in controller.event_rows())
+
+
+def test_hosts_are_independent():
+    controller = AdaptiveRateController(start_rate=8, max_rate=10, cooldown=0)
+    controller.record(URL, 429)
+    controller.record(OTHER_URL, 200, 0.05)
+    assert rate_of(controller) == 4
+    assert rate_of(controller, OTHER_URL) > 8
+
+
+def test_acquire_spaces_requests():
+    controller = AdaptiveRateController(start_rate=20, max_rate=20)
+    started = time.monotonic()
+    for _ in range(5):
+        controller.acquire(URL)
+    # 第一個權杖立即可用，其後每 1/20 秒一個
+    assert 0.15 <= time.monotonic() - started < 0.5
+
+
+def test_retry_after_pause_keeps_spacing():
+    controller = AdaptiveRateController(start_rate=4, max_rate=4, cooldown=0)
+    controller.acquire(URL)
+    controller.record(URL, 429, retry_after='1')  # 速率降為 2 次/秒並暫停 1 秒
+    started = time.monotonic()
+    released = []
+    lock = threading.Lock()
+
+    def worker():
+        controller.acquire(URL)
+        with lock:
+            released.append(time.monotonic() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    released.sort()
+    assert released[0] >= 0.9
+    # 暫停結束後不會一次放行，仍以 1/速率 的間隔送出
+    assert all(b - a >= 0.4 for a, b in zip(released, released[1:]))
@@ -0,0 +1,135 @@
+"""
+接續執行 (執行紀錄 + 圖片庫) 的回歸測試
+以 benchmarks/server.py 的替身伺服器在本機執行，不連到外部網站
+"""
+import os
+import threading
+import zipfile
+
+import pytest
+
+from archive import ArchiveWriter
+from benchmarks.server import ServerOptions, StandInServer
+from image_store import ImageStore
+from manifest import RunManifest
+from page_cache import PageCache
+from pipeline import BatchPipeline, ModelJob, write_model_to_zip
+from rate_control import AdaptiveRateController
+
+MODELS = [str(1128001 + i) for i in range(8)]
+FAST_RATE = 1000  # 本機伺服器不需限速
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(('127.0.0.1', 0), ServerOptions(image_size=1024))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    return server.base_url
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def make_pipeline(base_url, store, manifest, **kwargs):
+    return BatchPipeline(base_url, store=store, manifest=manifest,
+                         rate=AdaptiveRateController(FAST_RATE, FAST_RATE), **kwargs)
+
+
+def run_batch(base_url, tmp_path, name, **kwargs):
+    """執行一次批次並寫入 ZIP，回傳 (結果清單, ZIP 內容 {路徑: 位元組})"""
+    store = ImageStore(str(tmp_path / 'store'))
+    manifest = RunManifest(str(tmp_path / 'manifest.sqlite3'))
+    pipeline = make_pipeline(base_url, store, manifest, **kwargs)
+    jobs = [ModelJob(i, model) for i, model in enumerate(MODELS)]
+    zip_path = str(tmp_path / name)
+    try:
+        # 先收齊所有結果再寫入，模擬沿用紀錄的型號遠快於 ZIP 寫入的情況
+        results = list(pipeline.run(jobs))
+        with ArchiveWriter.create(zip_path) as archive:
+            for result in results:
+                write_model_to_zip(archive, result)
+    finally:
+        pipeline.client.close()
+        manifest.close()
+        store.close()
+    with zipfile.ZipFile(zip_path) as zf:
+        return results, {n: zf.read(n) for n in zf.namelist()}
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='需要 /proc 計算開啟的檔案')
+def test_resume_restores_without_holding_files_open(base_url, tmp_path):
+    first, first_zip = run_batch(base_url, tmp_path, 'first.zip')
+    assert not any(r.restored for r in first)
+    assert sum(len(r.images) for r in first) > len(MODELS)
+
+    store = ImageStore(str(tmp_path / 'store'))
+    manifest = RunManifest(str(tmp_path / 'manifest.sqlite3'))
+    pipeline = make_pipeline(base_url, store, manifest)
+    try:
+        before = open_fds()
+        restored = list(pipeline.run([ModelJob(i, model) for i, model in enumerate(MODELS)]))
+        # 已還原但尚未寫入 ZIP 的圖片不應佔用檔案描述元
+        assert open_fds() - before < len(MODELS)
+        assert all(r.restored for r in restored)
+    finally:
+        pipeline.client.close()
+        manifest.close()
+        store.close()
+
+    second, second_zip = run_batch(base_url, tmp_path, 'second.zip')
+    assert all(r.restored for r in second)
+    assert second_zip == first_zip
+
+
+def test_changed_settings_are_not_restored(base_url, tmp_path):
+    # 大小上限低於所有圖片：型號完成但沒有圖片
+    limited, _ = run_batch(base_url, tmp_path, 'limited.zip', max_image_bytes=100)
+    assert all(r.complete and not r.images for r in limited)
+
+    again, _ = run_batch(base_url, tmp_path, 'again.zip', max_image_bytes=100)
+    assert all(r.restored for r in again)
+
+    # 放寬上限後不沿用舊紀錄，先前因大小略過的圖片重新下載
+    unlimited, _ = run_batch(base_url, tmp_path, 'unlimited.zip')
+    assert not any(r.restored for r in unlimited)
+    assert all(r.images for r in unlimited)
+
+
+def test_incremental_recheck_bypasses_fresh_page_cache(server, tmp_path):
+    """增量模式在頁面快取有效期內仍能發現商品頁變更"""
+    base_url = server.base_url
+    jobs = [ModelJob(0, '2000001')]  # 無固定樣本頁的型號，頁面內容依伺服器的 seed 合成
+
+    def run(**kwargs):
+        store = ImageStore(str(tmp_path / 'store'))
+        manifest = RunManifest(str(tmp_path / 'manifest.sqlite3'))
+        cache = PageCache(str(tmp_path / 'pages.sqlite3'), ttl=3600)
+        pipeline = make_pipeline(base_url, store, manifest, cache=cache, **kwargs)
+        try:
+            result = next(pipeline.run(jobs))
+            result.close()
+            return result, cache.stats.snapshot()
+        finally:
+            pipeline.client.close()
+            cache.close()
+            manifest.close()
+            store.close()
+
+    first, _ = run()
+    assert first.images and not first.restored
+    unchanged, _ = run(incremental=True)
+    assert unchanged.restored
+
+    server.options.seed = 1  # 商品頁改版 (圖片清單不同)
+    changed, stats = run(incremental=True)
+    assert not changed.restored
+    assert stats.get('product', {}).get('hits', 0) == 0